@@ -0,0 +1,130 @@
+# Sanjay Mohan
+# Command line entry point: python -m NeuralNet train|evaluate|classify|gui ...
+# Only numpy is imported up front; data sets, matplotlib and Tk are imported and loaded by the subcommands that need
+# them, so eg classify starts quickly (see the cli_classify_startup benchmark).
+# Examples: python -m NeuralNet train mnist_new --epochs 10 --optimizer adam
+#           python -m NeuralNet evaluate mnist_exp_8520_converted mnist_new
+#           python -m NeuralNet classify mnist_exp_8520_converted digits.npy --top 3
+#           python -m NeuralNet gui --network mnist_exp_8520_converted
+
+import argparse
+import os
+
+import numpy as np
+
+
+def train(args):
+    from NeuralNet import mnistLoader
+    from NeuralNet import net
+    from NeuralNet import optimizers
+    from NeuralNet.checkpoint import Checkpointer
+    from NeuralNet.imageTranslator import Translator
+    training, validation, test = mnistLoader.load(expanded=args.data == "expanded", short=args.data == "short")
+    np.random.seed(args.seed)
+    checkpointer = Checkpointer(args.name + "_checkpoints")
+    if not args.resume:
+        checkpointer.clear()
+    network = net.Network(args.layout, dtype=np.float32 if args.float32 else None, activations=args.activations,
+                          cost=args.cost)
+    optimizer = {"sgd": optimizers.SGD, "momentum": optimizers.Momentum, "adam": optimizers.Adam}[args.optimizer]()
+    network.gradientDescent(training, args.epochs, args.minibatch_size, args.lrn_rate, valiData=validation,
+                            augmentation=Translator(seed=args.seed) if args.augment else None, seed=args.seed,
+                            optimizer=optimizer, patience=args.patience,
+                            checkpointer=checkpointer, resume=args.resume)
+    correct, total = network.evaluateBatch(test.images, test.labels)
+    print("Test accuracy:", str(100 * correct / total) + "%")
+    network.saveNetwork(args.name)
+
+
+def evaluate(args):
+    from NeuralNet import evaluationMatrix
+    from NeuralNet import mnistLoader
+    datasets = {}
+    for name in args.data:
+        if name == "mnist":
+            datasets["mnist test"] = mnistLoader.load()[2]
+        else:
+            datasets[os.path.basename(name)] = mnistLoader.loadMyImages(name)
+    results = evaluationMatrix.EvaluationMatrix().evaluate({name: name for name in args.networks}, datasets)
+    evaluationMatrix.report(results, args.confusion)
+
+
+def readImages(name):
+    """
+    :param name: .npy file of one image (784 values) or of images (N, 784), or a gui data set (.pkl.gz)
+    :return: (N, 784) np.array
+    """
+    if name.endswith(".npy"):
+        return np.load(name, mmap_mode="r").reshape((-1, 784))
+    from NeuralNet import mnistLoader
+    return mnistLoader.loadMyImages(name).images
+
+
+def classify(args):
+    from NeuralNet import net
+    network = net.loadNetwork(args.network)
+    for name in args.images:
+        images = readImages(name)
+        predictions, topDigits, topScores = network.predictBatch(images, topK=args.top)
+        for i in range(len(images)):
+            guesses = "  ".join("%d:%.3f" % (digit, score) for digit, score in zip(topDigits[i], topScores[i]))
+            print("%s[%d] %d  %s" % (name, i, predictions[i], guesses) if args.top > 1 else
+                  "%s[%d] %d" % (name, i, predictions[i]))
+
+
+def gui(args):
+    # Imported here: brings in Tk (and matplotlib, win32api only where used)
+    from NeuralNet import gui
+    gui.main(args.network, args.resume)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m NeuralNet", description="Handwritten digit classifier")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    parser_train = subparsers.add_parser("train", help="train a new network on mnist and save it")
+    parser_train.add_argument("name", help="file to save the network to")
+    parser_train.add_argument("--data", choices=["standard", "expanded", "short"], default="standard")
+    parser_train.add_argument("--layout", type=int, nargs="+", default=[784, 100, 10])
+    parser_train.add_argument("--activations", nargs="+", default="sigmoid", help="one name, or one per layer")
+    parser_train.add_argument("--cost", default="quadratic")
+    parser_train.add_argument("--epochs", type=int, default=30)
+    parser_train.add_argument("--minibatch-size", type=int, default=10)
+    parser_train.add_argument("--lrn-rate", type=float, default=0.1)
+    parser_train.add_argument("--optimizer", choices=["sgd", "momentum", "adam"], default="sgd")
+    parser_train.add_argument("--patience", type=int, help="stop after this many epochs without improvement")
+    parser_train.add_argument("--augment", action="store_true", help="translate training images randomly")
+    parser_train.add_argument("--float32", action="store_true", help="train in single precision")
+    parser_train.add_argument("--seed", type=int, default=0)
+    parser_train.add_argument("--resume", action="store_true",
+                              help="continue from the checkpoints of an interrupted run with the same arguments; "
+                                   "otherwise they are deleted")
+    parser_train.set_defaults(function=train)
+
+    parser_evaluate = subparsers.add_parser("evaluate", help="accuracy of saved networks on data sets")
+    parser_evaluate.add_argument("networks", nargs="+", help="saved network files")
+    parser_evaluate.add_argument("--data", nargs="+", default=["mnist", "datasets/mytestimages3.pkl.gz"],
+                                 help="\"mnist\" for the mnist test set, or gui data set files")
+    parser_evaluate.add_argument("--confusion", action="store_true", help="also print confusion matrices")
+    parser_evaluate.set_defaults(function=evaluate)
+
+    parser_classify = subparsers.add_parser("classify", help="print the digits of images")
+    parser_classify.add_argument("network", help="saved network file")
+    parser_classify.add_argument("images", nargs="+", help=".npy files of (N, 784) images, or gui data set files")
+    parser_classify.add_argument("--top", type=int, default=1, help="also print the top k digits and their scores")
+    parser_classify.set_defaults(function=classify)
+
+    parser_gui = subparsers.add_parser("gui", help="start the handwriting interpreter")
+    parser_gui.add_argument("--network", default="mnist_exp_8520_converted", help="saved network file")
+    parser_gui.add_argument("--resume", action="store_true",
+                            help="if the network has to be trained, continue from its interrupted run's checkpoints")
+    parser_gui.set_defaults(function=gui)
+
+    args = parser.parse_args(argv)
+    if isinstance(getattr(args, "activations", None), list) and len(args.activations) == 1:
+        args.activations = args.activations[0]
+    args.function(args)
+
+
+if __name__ == "__main__":
+    main()
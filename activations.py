@@ -0,0 +1,132 @@
+# Sanjay Mohan
+# Registry of activation and cost functions for net.Network and net.Layer
+# Each activation has a numerically stable forward pass that works in place on the weighted inputs, and a backward
+# pass that only needs the activations cached from the forward pass (so nothing is recomputed during backpropagation).
+# Arrays hold one sample per column, as everywhere in net.
+
+import numpy as np
+
+
+class Sigmoid:
+    name = "sigmoid"
+    elementwise = True  # each output depends only on its own input, so layers can be stacked (see evaluationMatrix)
+
+    def forward(self, z):
+        # 1 / (1 + e^-z), computed from e^-|z| so np.exp never overflows; overwrites and returns z
+        e = np.abs(z)
+        np.negative(e, out=e)
+        np.exp(e, out=e)
+        positive = z >= 0
+        # e^-|z| is e^-z where z >= 0, and 1 / e^-z (=e^z) otherwise: sigmoid(z) = 1 / (1 + e^-z) or e^z / (1 + e^z)
+        np.copyto(z, e)
+        z[positive] = 1
+        np.add(e, 1, out=e)
+        np.divide(z, e, out=z)
+        return z
+
+    def backward(self, a, gradient):
+        # Gradient with respect to the weighted inputs, from gradient with respect to the activations a
+        return gradient * a * (1 - a)
+
+
+class ReLU:
+    name = "relu"
+    elementwise = True
+
+    def forward(self, z):
+        return np.maximum(z, 0, out=z)
+
+    def backward(self, a, gradient):
+        return gradient * (a > 0)
+
+
+class Softmax:
+    name = "softmax"
+    elementwise = False
+
+    def forward(self, z):
+        # Subtracting the largest value of each column first keeps np.exp from overflowing
+        z -= z.max(axis=0)
+        np.exp(z, out=z)
+        z /= z.sum(axis=0)
+        return z
+
+    def backward(self, a, gradient):
+        # Product of the softmax jacobian with gradient, without building the jacobian
+        return a * (gradient - (gradient * a).sum(axis=0))
+
+
+class Quadratic:
+    name = "quadratic"
+
+    def value(self, expected, output, activation=None):
+        # Quadratic cost function, aka mean squared error (summed over columns)
+        return 0.5 * np.sum((expected - output) ** 2)
+
+    def prime(self, expected, output, activation=None):
+        # Derivative of cost function with respect to output
+        return output - expected
+
+    def delta(self, expected, output, activation):
+        # Output error: gradient with respect to the weighted inputs of the last layer
+        return activation.backward(output, output - expected)
+
+
+class CrossEntropy:
+    name = "crossentropy"
+    epsilon = 1e-12  # keeps np.log away from 0
+
+    def value(self, expected, output, activation=None):
+        # Softmax outputs are one probability distribution, so only the log of the expected digit's output counts;
+        # other outputs are independent, and the (1 - y) log(1 - a) terms count too
+        output = np.clip(output, self.epsilon, 1 - self.epsilon)
+        if isinstance(activation, Softmax):
+            return -np.sum(expected * np.log(output))
+        return -np.sum(expected * np.log(output) + (1 - expected) * np.log(1 - output))
+
+    def prime(self, expected, output, activation=None):
+        output = np.clip(output, self.epsilon, 1 - self.epsilon)
+        if isinstance(activation, Softmax):
+            return -expected / output
+        return (output - expected) / (output * (1 - output))
+
+    def delta(self, expected, output, activation):
+        # With sigmoid or softmax outputs the activation derivative cancels out, leaving output - expected; this is why
+        # cross entropy does not slow down learning when outputs saturate
+        if isinstance(activation, (Sigmoid, Softmax)):
+            return output - expected
+        return activation.backward(output, self.prime(expected, output, activation))
+
+
+activationFunctions = {}
+costFunctions = {}
+
+
+def registerActivation(activation):
+    # Makes activation (an object with name, forward and backward) available to layers by its name
+    activationFunctions[activation.name] = activation
+
+
+def registerCost(cost):
+    # Makes cost (an object with name, value, prime and delta) available to networks by its name
+    costFunctions[cost.name] = cost
+
+
+def getActivation(name):
+    try:
+        return activationFunctions[name]
+    except KeyError:
+        raise ValueError("Unknown activation function: ", name)
+
+
+def getCost(name):
+    try:
+        return costFunctions[name]
+    except KeyError:
+        raise ValueError("Unknown cost function: ", name)
+
+
+for function in (Sigmoid(), ReLU(), Softmax()):
+    registerActivation(function)
+for function in (Quadratic(), CrossEntropy()):
+    registerCost(function)
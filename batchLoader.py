@@ -0,0 +1,121 @@
+# Sanjay Mohan
+# Streaming minibatch pipeline for gradient descent
+# Minibatches are gathered (shuffled by index permutation), augmented and vectorized on a background thread into
+# preallocated buffers, so preparing the next minibatch overlaps with the matrix multiplies of the current one
+
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class MinibatchLoader:
+
+    def __init__(self, dataset, minibatchSize, augmentation=None, prefetch=2, background=True, seed=None,
+                 dtype=None):
+        """
+        Iterating over the loader yields one epoch of (inputs, expected) minibatches: (784, m) images, one per column,
+        and (10, m) vectorized digits. The arrays are reused buffers, valid only until the next minibatch is requested
+        :param dataset: mnistLoader.Dataset to draw minibatches from
+        :param minibatchSize: number of images per minibatch (the last minibatch of an epoch may be smaller)
+        :param augmentation: function applied to each minibatch's (m, 784) images, eg imageTranslator.Translator
+        :param prefetch: maximum number of prepared minibatches waiting in the queue
+        :param background: if False, minibatches are prepared on the calling thread (eg for debugging)
+        :param seed: seed of the random generator used to shuffle each epoch
+        :param dtype: dtype of the minibatches (eg the precision of the network); defaults to that of the dataset
+        """
+        if minibatchSize < 1 or prefetch < 1:
+            raise ValueError("Minibatch size and prefetch must be positive")
+        self.dataset = dataset
+        self.minibatchSize = minibatchSize
+        self.augmentation = augmentation
+        self.prefetch = prefetch
+        self.background = background
+        self.rng = np.random.default_rng(seed)
+        # One buffer per minibatch that can be in the queue, plus the one being prepared and the one being used
+        numBuffers = prefetch + 2
+        if dtype is None:
+            dtype = dataset.images.dtype
+        self.imageBuffers = [np.empty((minibatchSize, 784), dtype=dtype) for i in range(numBuffers)]
+        self.labelBuffers = [np.empty((10, minibatchSize), dtype=dtype) for i in range(numBuffers)]
+        # Counters: minibatches delivered, seconds spent waiting for the queue, sum of queue depths seen
+        self.batches = 0
+        self.stallTime = 0.0
+        self.queueDepthTotal = 0
+
+    def __len__(self):
+        # Number of minibatches per epoch
+        return -(-len(self.dataset) // self.minibatchSize)
+
+    def __iter__(self):
+        order = self.dataset.permutation(self.rng)
+        if not self.background:
+            for i in range(len(self)):
+                self.batches += 1
+                yield self.prepare(order, i)
+            return
+        batchQueue = queue.Queue(maxsize=self.prefetch)
+        stop = threading.Event()
+        worker = threading.Thread(target=self.produce, args=(order, batchQueue, stop), daemon=True)
+        worker.start()
+        try:
+            while True:
+                self.queueDepthTotal += batchQueue.qsize()
+                start = time.perf_counter()
+                batch = batchQueue.get()
+                self.stallTime += time.perf_counter() - start
+                if batch is None:
+                    break
+                if isinstance(batch, BaseException):
+                    raise batch
+                self.batches += 1
+                yield batch
+        finally:
+            # Also reached when the consumer stops early; lets the worker exit instead of blocking on a full queue
+            stop.set()
+            worker.join()
+
+    def produce(self, order, batchQueue, stop):
+        # Background thread: prepares every minibatch of the epoch, then puts None to signal the end
+        try:
+            for i in range(len(self)):
+                if not self.put(batchQueue, self.prepare(order, i), stop):
+                    return
+        except BaseException as error:
+            self.put(batchQueue, error, stop)
+            return
+        self.put(batchQueue, None, stop)
+
+    def put(self, batchQueue, item, stop):
+        # Returns False if the consumer stopped before item could be queued
+        while not stop.is_set():
+            try:
+                batchQueue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def prepare(self, order, i):
+        """
+        Gathers minibatch i of order into the next free buffer
+        :return: (784, m) np.array of images and (10, m) np.array of vectorized digits
+        """
+        indices = order[i * self.minibatchSize:(i + 1) * self.minibatchSize]
+        m = len(indices)
+        images = self.imageBuffers[i % len(self.imageBuffers)][:m]
+        labels = self.labelBuffers[i % len(self.labelBuffers)][:, :m]
+        if images.dtype == self.dataset.images.dtype:
+            np.take(self.dataset.images, indices, axis=0, out=images)
+        else:
+            images[:] = self.dataset.images[indices]
+        if self.augmentation is not None:
+            images[:] = self.augmentation(images)
+        labels.fill(0)
+        labels[self.dataset.labels[indices], np.arange(m)] = 1.0
+        return np.transpose(images), labels
+
+    def averageQueueDepth(self):
+        # Average number of prepared minibatches waiting when one was requested; near 0 means training is input-bound
+        return self.queueDepthTotal / max(self.batches, 1)
@@ -0,0 +1,191 @@
+# Sanjay Mohan
+# Benchmark suite for the hot paths of training, loading and classifying
+# Every benchmark uses fixed sizes and seeds (and synthetic mnist-shaped data, so no data set files are needed).
+# Results can be saved as a json baseline, and compare mode flags benchmarks that got slower than the baseline.
+# Usage: python -m NeuralNet.benchmark --save baseline.json
+#        python -m NeuralNet.benchmark --compare baseline.json --threshold 0.2
+
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import os
+import pickle
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from NeuralNet import imageStandardizer
+from NeuralNet import mnistLoader
+from NeuralNet import net
+
+
+layout = [784, 100, 10]
+seed = 0
+# Seconds some benchmarks must stay under regardless of the baseline
+budgets = {"cli_classify_startup": 0.5}
+
+
+def timeIt(function, repeats=5, number=1):
+    """
+    :param function: function without arguments to time
+    :param repeats: number of timings; the fastest is used since slower ones are mostly noise from other processes
+    :param number: calls per timing
+    :return: seconds per call
+    """
+    best = float("inf")
+    for i in range(repeats):
+        start = time.perf_counter()
+        for j in range(number):
+            function()
+        best = min(best, time.perf_counter() - start)
+    return best / number
+
+
+def syntheticImages(n, rng):
+    # mnist-like images: mostly 0, with some pixels set in the middle 20x20 square
+    images = np.zeros((n, 28, 28), dtype=np.float32)
+    images[:, 4:24, 4:24] = rng.random((n, 20, 20)) * (rng.random((n, 20, 20)) < 0.2)
+    return images.reshape((n, 784)), rng.integers(0, 10, n)
+
+
+def screenCanvas():
+    # A digit-sized drawing ("7") on a 1920x1080 screen, as recorded by the gui
+    canvas = np.zeros((1080, 1920))
+    canvas[300, 800:1100] = 0.98
+    rows = np.arange(300, 700)
+    canvas[rows, (1100 - (rows - 300) * 0.6).astype(int)] = 0.98
+    return canvas
+
+
+def quiet(function):
+    # Runs function without its progress printing
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return function()
+    return run
+
+
+def runBenchmarks(only=None):
+    """
+    :param only: list of benchmark names to run; all if None
+    :return: dict of benchmark name: seconds
+    """
+    rng = np.random.default_rng(seed)
+    np.random.seed(seed)
+    network = net.Network(layout)
+    images, labels = syntheticImages(10000, rng)
+    dataset = mnistLoader.Dataset(images, labels)
+    inputs, expected = dataset.batch(slice(0, 10))
+    canvas = screenCanvas()
+    directory = tempfile.mkdtemp()
+    results = {}
+
+    def epoch():
+        np.random.seed(seed)
+        net.Network(layout).gradientDescent(dataset, 1, 10, 0.1, seed=seed)
+
+    def load():
+        return mnistLoader.load()
+
+    def coldLoad():
+        shutil.rmtree(os.path.join(directory, "cache"), ignore_errors=True)
+        return mnistLoader.load()
+
+    # A saved network and images for the command line benchmark
+    quiet(lambda: network.saveNetwork(os.path.join(directory, "network")))()
+    np.save(os.path.join(directory, "images.npy"), images[:10])
+    packageParent = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def classifyCommand():
+        # Whole run of python -m NeuralNet classify, most of which is starting up
+        subprocess.run([sys.executable, "-m", "NeuralNet", "classify", os.path.join(directory, "network"),
+                        os.path.join(directory, "images.npy")], cwd=packageParent, check=True, stdout=subprocess.DEVNULL)
+
+    def expand():
+        mnistLoader.createExpandedSet(dataset[:2000], dataset[2000:2500], dataset[2500:3000])
+
+    benchmarks = {
+        "feedforward_single": (lambda: network.feedforward(inputs[:, :1]), 5, 1000),
+        "feedforward_batch_10000": (lambda: network.predictBatch(images), 5, 1),
+        "backpropagation_single": (lambda: network.backpropagation(inputs[:, :1], expected[:, :1]), 5, 1000),
+        "backpropagation_minibatch_10": (lambda: network.backpropagation(inputs, expected), 5, 1000),
+        "gradientDescent_epoch_10000": (quiet(epoch), 3, 1),
+        "standardize_screen_canvas": (lambda: imageStandardizer.standardize(canvas), 5, 10),
+        "mnistLoader_load_cold": (quiet(coldLoad), 3, 1),
+        "mnistLoader_load_cached": (quiet(load), 5, 10),
+        "createExpandedSet_2000": (quiet(expand), 3, 1),
+        "cli_classify_startup": (classifyCommand, 5, 1),
+    }
+    # mnistLoader reads and writes its files in the temporary directory for the duration of the benchmarks
+    names = (mnistLoader.mnist, mnistLoader.expandedmnist)
+    mnistLoader.mnist = os.path.join(directory, "mnist.pkl.gz")
+    mnistLoader.expandedmnist = os.path.join(directory, "expandedmnist.pkl.gz")
+    try:
+        with gzip.open(mnistLoader.mnist, "w") as file:
+            pickle.dump(((images, labels), (images[:1000], labels[:1000]), (images[:1000], labels[:1000])), file)
+        for name, (function, repeats, number) in benchmarks.items():
+            if only is None or name in only:
+                results[name] = timeIt(function, repeats, number)
+                print("%-32s %12.6f s" % (name, results[name]))
+    finally:
+        mnistLoader.mnist, mnistLoader.expandedmnist = names
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def compare(baseline, results, threshold):
+    """
+    :param baseline: dict of benchmark name: seconds, from a previous run
+    :param results: dict of benchmark name: seconds, from this run
+    :param threshold: fraction by which a benchmark may be slower before it counts as a regression (eg 0.2)
+    :return: list of names of regressed benchmarks
+    """
+    regressions = []
+    print()
+    print("%-32s %12s %12s %8s" % ("benchmark", "baseline s", "current s", "change"))
+    for name, seconds in results.items():
+        if name not in baseline:
+            print("%-32s %12s %12.6f %8s" % (name, "-", seconds, "new"))
+            continue
+        change = seconds / baseline[name] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print("%-32s %12.6f %12.6f %+7.0f%%%s" % (name, baseline[name], seconds, 100 * change, flag))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the hot paths of the network, standardizer and loader")
+    parser.add_argument("--save", help="write results to this json baseline file")
+    parser.add_argument("--compare", help="json baseline file to compare results against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before flagging, eg 0.2")
+    parser.add_argument("--only", nargs="+", help="names of benchmarks to run")
+    args = parser.parse_args()
+    results = runBenchmarks(args.only)
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump({"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+                       "results": results}, file, indent=1)
+    overBudget = [name for name, seconds in budgets.items() if results.get(name, 0) > seconds]
+    for name in overBudget:
+        print(name, "took %.3f s, over its budget of %.3f s" % (results[name], budgets[name]))
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+        if compare(baseline, results, args.threshold):
+            raise SystemExit(1)
+    if overBudget:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
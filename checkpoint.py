@@ -0,0 +1,140 @@
+# Sanjay Mohan
+# Periodic, non-blocking checkpoints of training, so a crashed or stopped run can continue where it left off
+# At the end of an epoch the weights, biases, optimizer state and random generator states are copied (quick), and the
+# copies are written to disk on a background thread while training continues. Each checkpoint is a directory:
+# "network" (modelFormat), "optimizer.npz" and "state.json"; only the newest few are kept.
+
+import json
+import os
+import queue
+import shutil
+import threading
+
+import numpy as np
+
+from NeuralNet import net
+
+
+class Checkpointer:
+
+    def __init__(self, directory, everyEpochs=1, keep=3):
+        """
+        Pass to net.Network.gradientDescent as checkpointer (with resume=True to continue from the latest checkpoint)
+        :param directory: directory to keep checkpoints in; created if needed
+        :param everyEpochs: a checkpoint is saved after every everyEpochs epochs
+        :param keep: number of newest checkpoints kept; older ones are deleted
+        """
+        self.directory = directory
+        self.everyEpochs = everyEpochs
+        self.keep = keep
+        self.writes = queue.Queue()
+        self.writer = None
+        # Left behind if an earlier run stopped while writing a checkpoint
+        self.removePartial()
+
+    def checkpoints(self):
+        # Names of the complete checkpoints, oldest first
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory) if name.startswith("epoch_")
+                      and not name.endswith(".tmp"))
+
+    def clear(self):
+        # Deletes all checkpoints, so a new training run does not mix with (or resume from) an earlier one
+        for name in self.checkpoints():
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def removePartial(self):
+        # Deletes checkpoints whose writing never finished
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.startswith("epoch_") and name.endswith(".tmp"):
+                shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    def latest(self):
+        # Path of the newest complete checkpoint, or None
+        names = self.checkpoints()
+        return os.path.join(self.directory, names[-1]) if names else None
+
+    def epochEnd(self, epoch, network, optimizer, loader, augmentation, state):
+        """
+        Called by gradientDescent after each epoch; snapshots and queues a checkpoint every everyEpochs epochs
+        :param epoch: number of epochs completed
+        :param state: json-serializable training state (eg history) to restore on resume
+        """
+        if epoch % self.everyEpochs != 0:
+            return
+        # Copies, so training can go on changing the originals while the checkpoint is written
+        snapshot = network.copy()
+        optimizerState = {name + "_" + str(i): np.array(array) for name, arrays in optimizer.state().items()
+                          for i, array in enumerate(arrays)}
+        state = dict(state, epoch=epoch, loaderRng=loader.rng.bit_generator.state)
+        if getattr(augmentation, "rng", None) is not None:
+            state["augmentationRng"] = augmentation.rng.bit_generator.state
+        if self.writer is None:
+            self.writer = threading.Thread(target=self.write)
+            self.writer.start()
+        self.writes.put((epoch, snapshot, optimizerState, state))
+
+    def write(self):
+        # Background thread: writes queued checkpoints until None is queued
+        while True:
+            item = self.writes.get()
+            if item is None:
+                return
+            epoch, snapshot, optimizerState, state = item
+            path = os.path.join(self.directory, "epoch_%05d" % epoch)
+            # Written under a temporary name and renamed when complete, so a crash never leaves a partial checkpoint
+            temporary = path + ".tmp"
+            shutil.rmtree(temporary, ignore_errors=True)
+            os.makedirs(temporary)
+            snapshot.saveNetwork(os.path.join(temporary, "network"))
+            np.savez(os.path.join(temporary, "optimizer.npz"), **optimizerState)
+            with open(os.path.join(temporary, "state.json"), "w") as file:
+                json.dump(state, file)
+            shutil.rmtree(path, ignore_errors=True)
+            os.rename(temporary, path)
+            self.rotate()
+
+    def rotate(self):
+        # Deletes all but the newest self.keep checkpoints, and any partial ones (this thread is the only writer)
+        for name in self.checkpoints()[:-self.keep]:
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+        self.removePartial()
+
+    def wait(self):
+        # Blocks until all queued checkpoints are written
+        if self.writer is not None:
+            self.writes.put(None)
+            self.writer.join()
+            self.writer = None
+
+    def restore(self, network, optimizer, loader, augmentation):
+        """
+        Loads the latest checkpoint into network, optimizer (already set up), loader and augmentation
+        :return: training state saved with the checkpoint, or None if there is no checkpoint
+        """
+        path = self.latest()
+        if path is None:
+            return None
+        saved = net.loadNetwork(os.path.join(path, "network"))
+        layout = [(layer.w.shape, layer.b.shape, layer.activation) for layer in network.layers[1:]]
+        savedLayout = [(layer.w.shape, layer.b.shape, layer.activation) for layer in saved.layers[1:]]
+        if layout != savedLayout:
+            raise ValueError("Checkpoint %s does not match the network: layers (weights, biases, activation) %s, "
+                             "network %s" % (path, savedLayout, layout))
+        for layer, savedLayer in zip(network.layers[1:], saved.layers[1:]):
+            # In place, since the arrays may be shared (eg with parallelTraining workers)
+            layer.w[...] = savedLayer.w
+            layer.b[...] = savedLayer.b
+        with np.load(os.path.join(path, "optimizer.npz")) as arrays:
+            optimizer.loadState({name: [arrays[name + "_" + str(i)] for i in range(len(buffers))]
+                                 for name, buffers in optimizer.state().items()})
+        with open(os.path.join(path, "state.json")) as file:
+            state = json.load(file)
+        loader.rng.bit_generator.state = state["loaderRng"]
+        if "augmentationRng" in state and augmentation is not None:
+            augmentation.rng.bit_generator.state = state["augmentationRng"]
+        print("Resuming from", path)
+        return state
@@ -0,0 +1,107 @@
+# Sanjay Mohan
+# Uncompressed, memory-mapped cache for the gzipped pickle data sets
+# The first time a .pkl.gz file is loaded its arrays are written out as raw .npy files alongside a small json manifest;
+# later loads open those files with np.memmap, which takes constant time and only reads pages that are actually used.
+# The cache is rebuilt automatically when the source file's hash changes.
+
+import gzip
+import hashlib
+import json
+import os
+import pickle
+import shutil
+
+import numpy as np
+
+
+manifestName = "manifest.json"
+manifestVersion = 1
+
+
+def cachePath(source):
+    """
+    :param source: path of a .pkl.gz data set
+    :return: directory holding the cached arrays of source (eg datasets/cache/mnist for datasets/mnist.pkl.gz)
+    """
+    name = os.path.basename(source)
+    for extension in (".gz", ".pkl"):
+        if name.endswith(extension):
+            name = name[:-len(extension)]
+    return os.path.join(os.path.dirname(source), "cache", name)
+
+
+def fileHash(path):
+    # sha256 of a file, read in 1 MB blocks so large files are never fully in memory
+    sha = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def loadArrays(source, convert):
+    """
+    Opens the cached arrays of source, building (or rebuilding) the cache first if needed
+    :param source: path of a .pkl.gz data set
+    :param convert: function that takes the unpickled contents of source and returns a dict of name: np.array
+    :return: dict of name: read-only memory-mapped np.array
+    """
+    directory = cachePath(source)
+    manifest = readManifest(directory)
+    stat = os.stat(source)
+    if manifest is None or (manifest["size"], manifest["mtime"]) != (stat.st_size, stat.st_mtime_ns):
+        # Size or modification time differ (eg file was copied or touched); only rebuild if the contents changed
+        sha = fileHash(source)
+        if manifest is None or manifest["sha256"] != sha:
+            manifest = buildCache(source, directory, sha, convert)
+        else:
+            manifest["size"], manifest["mtime"] = stat.st_size, stat.st_mtime_ns
+            writeManifest(directory, manifest)
+    return {name: np.load(os.path.join(directory, info["file"]), mmap_mode="r")
+            for name, info in manifest["arrays"].items()}
+
+
+def readManifest(directory):
+    # Returns the manifest of a cache directory, or None if there is no usable cache
+    try:
+        with open(os.path.join(directory, manifestName)) as file:
+            manifest = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+    if manifest.get("version") != manifestVersion:
+        return None
+    for info in manifest["arrays"].values():
+        if not os.path.exists(os.path.join(directory, info["file"])):
+            return None
+    return manifest
+
+
+def writeManifest(directory, manifest):
+    # Written to a temporary file first so a crash never leaves a half written manifest behind
+    temporary = os.path.join(directory, manifestName + ".tmp")
+    with open(temporary, "w") as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(temporary, os.path.join(directory, manifestName))
+
+
+def buildCache(source, directory, sha, convert):
+    """
+    Decompresses and unpickles source once and writes each of its arrays to an uncompressed .npy file
+    :return: manifest of the new cache
+    """
+    print("Building cache of", source)
+    stat = os.stat(source)
+    file = gzip.open(source, "rb")
+    arrays = convert(pickle.load(file, encoding="latin1"))
+    file.close()
+    # Remove the old cache entirely, so a manifest never refers to arrays from an older version of source
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+    manifest = {"version": manifestVersion, "source": os.path.basename(source), "size": stat.st_size,
+                "mtime": stat.st_mtime_ns, "sha256": sha, "arrays": {}}
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        np.save(os.path.join(directory, name + ".npy"), array)
+        manifest["arrays"][name] = {"file": name + ".npy", "shape": list(array.shape), "dtype": array.dtype.str}
+    writeManifest(directory, manifest)
+    return manifest
@@ -0,0 +1,71 @@
+# Sanjay Mohan
+# Ensemble of networks with the same topology, classified together in one pass
+# The first layers of all networks are stacked into one (N * hidden, 784) matrix, so each chunk of images is multiplied
+# once; every later layer is an (N, nodes, prevNodes) stack multiplied by np.matmul as one batched operation. The N
+# outputs are then combined by averaging them or by a majority vote.
+
+import numpy as np
+
+from NeuralNet import net
+from NeuralNet.activations import getActivation
+
+
+class Ensemble:
+
+    def __init__(self, networks, combine="average"):
+        """
+        :param networks: list of net.Networks or saved network file names, all with the same layout and activations
+        :param combine: "average" to average the networks' outputs, or "vote" for the digit most networks predict
+        (ties broken by average output)
+        """
+        networks = [net.loadNetwork(network) if isinstance(network, str) else network for network in networks]
+        if combine not in ("average", "vote"):
+            raise ValueError("Unknown way to combine networks: ", combine)
+        first = networks[0]
+        layout = [(layer.w.shape, layer.activation) for layer in first.layers[1:]]
+        for network in networks[1:]:
+            if [(layer.w.shape, layer.activation) for layer in network.layers[1:]] != layout:
+                raise ValueError("Networks of an ensemble must have the same layout and activations")
+        self.combine = combine
+        self.size = len(networks)
+        self.dtype = np.result_type(*(network.dtype for network in networks))
+        self.activations = [getActivation(activation) for _, activation in layout]
+        self.hidden = first.layers[1].size
+        # First layers stacked vertically: rows n * hidden to (n + 1) * hidden belong to network n
+        self.firstW = np.concatenate([network.layers[1].w for network in networks]).astype(self.dtype)
+        self.firstB = np.concatenate([network.layers[1].b for network in networks]).astype(self.dtype)
+        # Later layers as (N, nodes, prevNodes) and (N, nodes, 1) stacks
+        self.w = [np.stack([network.layers[l].w for network in networks]).astype(self.dtype)
+                  for l in range(2, first.numLayers)]
+        self.b = [np.stack([network.layers[l].b for network in networks]).astype(self.dtype)
+                  for l in range(2, first.numLayers)]
+
+    def memberOutputs(self, inputs):
+        """
+        :param inputs: (784, m) np.array, one image per column
+        :return: (N, outputs, m) np.array with the output of each network
+        """
+        x = np.asarray(inputs, dtype=self.dtype)
+        a = (self.firstW.dot(x) + self.firstB).reshape((self.size, self.hidden, x.shape[1]))
+        for l, activation in enumerate(self.activations):
+            if l > 0:
+                a = np.matmul(self.w[l - 1], a)
+                a += self.b[l - 1]
+            # Activations work along axis 0 (eg softmax), so each network's outputs are put there in a view
+            a = activation.forward(a.transpose((1, 0, 2))).transpose((1, 0, 2))
+        return a
+
+    def feedforward(self, inputs):
+        # Combined output of the ensemble, (outputs, m) like net.Network.feedforward
+        outputs = self.memberOutputs(inputs)
+        average = outputs.mean(axis=0)
+        if self.combine == "average":
+            return average
+        votes = np.zeros_like(average)
+        np.add.at(votes, (outputs.argmax(axis=1), np.arange(outputs.shape[2])), 1)
+        # Average outputs scaled to [0, 0.5), so they only decide ties
+        return votes + (average - average.min()) / (2 * (np.ptp(average) + 1))
+
+    # Batched classification and evaluation, exactly as for a single network
+    predictBatch = net.Network.predictBatch
+    evaluateBatch = net.Network.evaluateBatch
@@ -0,0 +1,157 @@
+# Sanjay Mohan
+# Evaluates several saved networks on several data sets at once and prints one report
+# Each data set is loaded once. Networks whose first layers have the same input size, precision and an elementwise
+# activation have those layers stacked into one matrix, so a chunk of images is multiplied once for all of them; the
+# remaining layers of each network then run on its own rows. Predictions are cached per (model file, data set) pair,
+# keyed by the hashes of both, so only changed models or data sets are evaluated again.
+
+import hashlib
+import os
+
+import numpy as np
+
+from NeuralNet import datasetCache
+from NeuralNet import mnistLoader
+from NeuralNet import modelFormat
+from NeuralNet import net
+from NeuralNet.activations import getActivation
+
+
+def datasetHash(dataset):
+    # sha256 of a Dataset's images and labels
+    sha = hashlib.sha256()
+    for first in range(0, len(dataset), 10000):
+        sha.update(np.ascontiguousarray(dataset.images[first:first + 10000]).tobytes())
+    sha.update(np.ascontiguousarray(dataset.labels).tobytes())
+    return sha.hexdigest()
+
+
+def stackedPredictions(networks, images, chunkSize=1000):
+    """
+    Predicted digits of every network for every image, sharing the first layer matrix multiply where possible
+    :param networks: list of net.Networks
+    :param images: (N, 784) np.array with one image per row
+    :param chunkSize: number of images pushed through the networks together
+    :return: list with (N,) np.array of predicted digits for each network
+    """
+    predictions = [np.empty(len(images), dtype=np.int8) for _ in networks]
+    # Networks that can share a stacked first layer, by (input size, precision, activation)
+    groups = {}
+    for n, network in enumerate(networks):
+        layer = network.layers[1]
+        if isinstance(layer, net.Layer) and getattr(getActivation(layer.activation), "elementwise", False):
+            key = (layer.w.shape[1], network.dtype, layer.activation)
+        else:
+            key = n
+        groups.setdefault(key, []).append(n)
+    for key, members in groups.items():
+        if not isinstance(key, tuple):
+            predictions[key][:] = networks[key].predictBatch(images, chunkSize)[0]
+            continue
+        firstLayers = [networks[n].layers[1] for n in members]
+        w = np.concatenate([layer.w for layer in firstLayers])
+        b = np.concatenate([layer.b for layer in firstLayers])
+        # Rows of the stacked output belonging to each network
+        bounds = np.cumsum([0] + [layer.size for layer in firstLayers])
+        activation = getActivation(firstLayers[0].activation)
+        dtype = networks[members[0]].dtype
+        for first in range(0, len(images), chunkSize):
+            last = min(first + chunkSize, len(images))
+            x = np.asarray(np.transpose(images[first:last]), dtype=dtype)
+            hidden = activation.forward(w.dot(x) + b)
+            for n, start, end in zip(members, bounds[:-1], bounds[1:]):
+                a = hidden[start:end]
+                for layer in networks[n].layers[2:]:
+                    a = layer.calculate(a)
+                predictions[n][first:last] = np.argmax(a, axis=0)
+    return predictions
+
+
+def scores(predictions, labels):
+    """
+    :param predictions: (N,) np.array of predicted digits
+    :param labels: (N,) np.array of correct digits
+    :return: dict with overall "accuracy" (%), "perClass" accuracy (%) of each digit and "confusion" matrix, whose
+    row is the correct digit and column the predicted digit
+    """
+    labels = np.asarray(labels, dtype=np.int64)
+    confusion = np.bincount(labels * 10 + predictions, minlength=100).reshape((10, 10))
+    perDigit = confusion.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        perClass = 100 * np.diag(confusion) / perDigit
+    return {"accuracy": 100 * np.trace(confusion) / max(len(labels), 1), "perClass": perClass, "confusion": confusion}
+
+
+class EvaluationMatrix:
+
+    def __init__(self, cacheDirectory="datasets/cache/predictions", chunkSize=1000):
+        """
+        :param cacheDirectory: where predictions are cached
+        :param chunkSize: number of images pushed through the networks together
+        """
+        self.cacheDirectory = cacheDirectory
+        self.chunkSize = chunkSize
+        os.makedirs(cacheDirectory, exist_ok=True)
+
+    def cachePath(self, modelHash, datasetHash):
+        return os.path.join(self.cacheDirectory, modelHash[:16] + "_" + datasetHash[:16] + ".npy")
+
+    def evaluate(self, models, datasets):
+        """
+        :param models: dict of name: saved network file name (see net.loadNetwork)
+        :param datasets: dict of name: mnistLoader.Dataset (or list of (image, digit) tuples)
+        :return: dict of (model name, data set name): scores (see scores)
+        """
+        modelHashes = {name: datasetCache.fileHash(path) for name, path in models.items()}
+        networks = {}
+        results = {}
+        for datasetName, dataset in datasets.items():
+            dataset = mnistLoader.asDataset(dataset)
+            key = datasetHash(dataset)
+            # Models whose predictions on this data set are not cached
+            missing = [name for name in models if not os.path.exists(self.cachePath(modelHashes[name], key))]
+            for name in missing:
+                if name not in networks:
+                    networks[name] = net.loadNetwork(models[name])
+            computed = dict(zip(missing, stackedPredictions([networks[name] for name in missing], dataset.images,
+                                                            self.chunkSize)))
+            for name in models:
+                path = self.cachePath(modelHashes[name], key)
+                if name in computed:
+                    np.save(path, computed[name])
+                    predictions = computed[name]
+                else:
+                    predictions = np.load(path)
+                results[(name, datasetName)] = scores(predictions, dataset.labels)
+        return results
+
+
+def report(results, confusion=False):
+    """
+    Prints an accuracy table (models by data sets) followed by per-digit accuracy of every pair
+    :param results: return value of EvaluationMatrix.evaluate
+    :param confusion: if True, also prints each pair's confusion matrix
+    """
+    modelNames = list(dict.fromkeys(name for name, _ in results))
+    datasetNames = list(dict.fromkeys(name for _, name in results))
+    width = max(len(name) for name in modelNames + ["per digit %"])
+    print(" " * width, *("%14s" % name[:14] for name in datasetNames))
+    for model in modelNames:
+        print("%-*s" % (width, model), *("%13.2f%%" % results[(model, name)]["accuracy"] for name in datasetNames))
+    print()
+    print("%-*s %-14s" % (width, "per digit %", "data set"), *("%5d" % digit for digit in range(10)))
+    for (model, datasetName), result in results.items():
+        print("%-*s %-14s" % (width, model, datasetName[:14]), *("%5.1f" % value for value in result["perClass"]))
+        if confusion:
+            print(result["confusion"])
+
+
+if __name__ == "__main__":
+    # The evaluations networktesting.py made by hand, as one matrix
+    _, _, testData = mnistLoader.load()
+    datasets = {"mnist test": testData,
+                "my test": mnistLoader.loadMyImages("datasets/mytestimages3.pkl.gz"),
+                "my test exp": mnistLoader.loadMyImages("datasets/mytestimages3_expanded.pkl.gz")}
+    # Every saved network in the working directory
+    models = {name: name for name in sorted(os.listdir(".")) if os.path.isfile(name) and modelFormat.isModelFile(name)}
+    report(EvaluationMatrix().evaluate(models, datasets))
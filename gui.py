@@ -5,19 +5,22 @@
 import os
 import sys
 sys.path.append(os.path.dirname(__file__ + "/../../.."))
-print(sys.path)
 
 from tkinter import *
 import tkinter.filedialog
+import tkinter.simpledialog
 import numpy as np
-import matplotlib.pyplot as plt
-import win32api
-import gzip
-import pickle
+import queue
+import threading
+import time
+import traceback
 
 from NeuralNet import mnistLoader
-from NeuralNet.imageStandardizer import standardize
+from NeuralNet.imageStandardizer import standardize, rasterize, IncrementalRasterizer
 from NeuralNet import net
+from NeuralNet.checkpoint import Checkpointer
+from NeuralNet.imageTranslator import Translator
+from NeuralNet.onlineLearning import SampleStore, FineTuner
 
 
 # If testmode is True, enables multiple debugging and accessory functionality such as viewing written images
@@ -28,7 +31,7 @@ testmode = False
 
 class Gui:
 
-    def __init__(self, master, rootWidth, rootHeight, network):
+    def __init__(self, master, rootWidth, rootHeight, network, sampleStore=None):
         """
         Sets up frames to hold canvas and text field
         Frames are centered vertically except buffer frame on top which spans all x
@@ -37,6 +40,7 @@ class Gui:
         :param rootWidth: width of root panel in px
         :param rootHeight: height of root panel in px
         :param network: NeuralNet.net to classify drawn digits
+        :param sampleStore: name of file to keep corrected digits in for online learning (see onlineLearning)
         """
         self.master = master
         self.screenWidth = self.master.winfo_screenwidth()
@@ -61,15 +65,45 @@ class Gui:
         self.textField.configure(yscrollcommand=scroll.set)
         scroll.pack(side=RIGHT, fill=Y)
 
+        self.onlineLearning = BooleanVar(value=False)
+        # Live recognition: while a digit is drawn it is classified every liveInterval ms (see IncrementalRasterizer),
+        # and with early commit it is ended as soon as the network is confident, without waiting for resetTime
+        self.liveMode = BooleanVar(value=False)
+        self.earlyCommit = BooleanVar(value=False)
         self.makeMenus()
         self.bindEvents()
         self.network = network
-        self.drawnPoints = np.zeros((self.screenHeight, self.screenWidth))  # holds drawn points!
+        self.strokes = []  # holds drawn points! as (lastx, lasty, x, y) segments, see imageStandardizer.rasterize
         self.f = None  # for saving text
         self.drawmode = False
         self.resetTime = 1000  # time after last mouse movement before drawn image is processed
         self.lastx = -1
         self.lasty = -1
+        # Drawn digits are classified on a worker thread so drawing never waits for the network; its results are
+        # picked up from self.results every pollInterval ms on the Tk thread (Tk may only be used from that thread)
+        self.requests = queue.Queue()
+        self.results = queue.Queue()
+        self.pollInterval = 15
+        threading.Thread(target=self.classifyDigits, daemon=True).start()
+        self.master.after(self.pollInterval, self.pollResults)
+        # Online learning: last classified image and where its digit is in the text field, for correcting it
+        self.sampleStoreName = sampleStore
+        self.fineTuner = None
+        self.lastSample = None
+        self.live = IncrementalRasterizer(self.screenWidth, self.screenHeight)
+        self.liveInterval = 100
+        self.commitConfidence = 0.9  # share of the network's output the top digit needs to commit early
+        self.commitAgreement = 3  # number of live predictions in a row of the same digit needed to commit early
+        self.lastLive = 0.0
+        self.livePending = False  # at most one live prediction waits for the worker thread at a time
+        self.liveStreak = (None, 0)
+        self.digitId = 0  # number of the digit being drawn, so late live predictions of earlier digits are ignored
+        self.bufferFrame.pack_propagate(False)
+        self.liveLabel = Label(self.bufferFrame, anchor=W, font=("Times", "16"))
+        self.liveLabel.pack(side=LEFT, fill=BOTH)
+        # Errors of the background threads, and in testmode the latency of each stage of classifying the last digit
+        self.status = Label(self.bufferFrame, anchor=E)
+        self.status.pack(side=RIGHT, fill=BOTH)
         # For generating new image sets:
         if testmode:
             self.myimages = []
@@ -109,6 +143,17 @@ class Gui:
         speedMenu.add_command(label="Normal", command=self.menuNormal)
         speedMenu.add_command(label="Fast", command=self.menuFast)
 
+        learningMenu = Menu(menu, tearoff=0)
+        menu.add_cascade(label="Learning", menu=learningMenu)
+        learningMenu.add_checkbutton(label="Learn From Corrections", variable=self.onlineLearning,
+                                     command=self.menuOnlineLearning)
+        learningMenu.add_command(label="Correct Last Digit...", command=self.menuCorrect)
+
+        liveMenu = Menu(menu, tearoff=0)
+        menu.add_cascade(label="Live", menu=liveMenu)
+        liveMenu.add_checkbutton(label="Live Recognition", variable=self.liveMode)
+        liveMenu.add_checkbutton(label="Commit Early", variable=self.earlyCommit)
+
     def leftClick(self, event=None):
         # Spacebar!
         self.updateText(" ")
@@ -117,7 +162,7 @@ class Gui:
         # Toggle drawing mode
         self.drawmode = not self.drawmode
         if self.drawmode:
-            win32api.SetCursorPos((920, 400))
+            centerCursor()
             self.lastx = -1
             self.lasty = -1
 
@@ -125,7 +170,7 @@ class Gui:
         self.textField.insert(END, txt)
 
     def motion(self, event):
-        # Capture mouse motion, record points visually and in self.drawnPoints
+        # Capture mouse motion, record points visually and in self.strokes
         if not self.drawmode:
             return
         # Reset timer
@@ -152,41 +197,94 @@ class Gui:
         self.canvas.create_line(lastxPos, lastyPos, xPos, yPos, width=radius, fill="black")
 
     def record(self, event):
-        # Fill in every pixel between last coords and new coords;
-        # sometimes quick movement causes choppy point registration; this fills in gaps
-        dx = event.x_root - self.lastx
-        dy = event.y_root - self.lasty
-        maxDist = int(max(abs(dx), abs(dy)))
-        for pt in range(maxDist):
-            x = int(pt / maxDist * dx + self.lastx)
-            y = int(pt / maxDist * dy + self.lasty)
-            # python - where compound inequalities exist!
-            if 0 <= x < self.screenWidth \
-                    and 0 <= y < self.screenHeight:
-                self.drawnPoints[y, x] = 0.98
+        # Record the movement from last coords to new coords; every pixel in between is filled in when rasterized
+        # since sometimes quick movement causes choppy point registration
+        if (event.x_root, event.y_root) != (self.lastx, self.lasty):
+            self.strokes.append((self.lastx, self.lasty, event.x_root, event.y_root))
+            if self.liveMode.get():
+                self.live.add(self.strokes[-1:])
+                self.requestLive()
         self.lastx = event.x_root
         self.lasty = event.y_root
 
     def inputEnd(self):
-        # Called after user has input a hand drawn digit
-        wasDrawModeOnBefore = self.drawmode
-        self.drawmode = False
-        if np.count_nonzero(self.drawnPoints) > 1:
-            # To prevent processing random erroneous single points when user does not input motion
-            self.identify()
+        # Called after user has input a hand drawn digit; it is classified on the worker thread (see classifyDigits)
+        if self.strokes:
+            self.requests.put(("strokes", self.strokes, self.digitId, time.perf_counter()))
         self.resetPoints()
-        win32api.SetCursorPos((920, 400))
+        centerCursor()
         self.lastx = -1
         self.lasty = -1
-        self.drawmode = wasDrawModeOnBefore
 
-    def identify(self, event=None):
-        # Feeds points drawn into GUI into the GUI's neural network; updates text with classified digit
-        pts = standardize(self.drawnPoints)
-        if self.network:
-            result = self.network.feedforward(pts)
+    def requestLive(self):
+        # Queues the digit drawn so far for a live prediction, at most every liveInterval ms
+        now = time.perf_counter()
+        if self.livePending or now - self.lastLive < self.liveInterval / 1000:
+            return
+        pts = self.live.image()
+        if pts is not None:
+            self.livePending = True
+            self.lastLive = now
+            self.requests.put(("live", pts, self.digitId, now))
+
+    def classifyDigits(self):
+        # Worker thread: rasterizes, standardizes and classifies each drawn digit, and queues the result
+        # Live requests are already standardized (by self.live), so only the network runs for them
+        # Errors are reported through the results queue, so the thread keeps classifying later digits
+        while True:
+            kind, data, digitId, start = self.requests.get()
+            try:
+                if kind == "live":
+                    network = self.network
+                    self.results.put(("live", data, network.feedforward(data) if network else None, digitId, start))
+                    continue
+                pts, result, stages = self.identify(data)
+                if pts is not None:
+                    self.results.put(("final", pts, result, stages, start))
+            except Exception as error:
+                traceback.print_exc()
+                self.results.put(("error", kind, "Classifying failed: %s: %s" % (type(error).__name__, error)))
+
+    def identify(self, strokes):
+        """
+        Feeds points drawn into GUI into the GUI's neural network
+        :param strokes: drawn segments, as self.strokes
+        :return: standardized (784, 1) image (None if nothing was drawn), output of network (None if there is no
+        network) and dict of seconds taken by each stage
+        """
+        times = [time.perf_counter()]
+        drawnPoints = rasterize(strokes, self.screenWidth, self.screenHeight)
+        times.append(time.perf_counter())
+        if np.count_nonzero(drawnPoints) <= 1:
+            # To prevent processing random erroneous single points when user does not input motion
+            return None, None, {}
+        pts = standardize(drawnPoints)
+        times.append(time.perf_counter())
+        network = self.network  # may be replaced by fine-tuning meanwhile
+        result = network.feedforward(pts) if network else None
+        times.append(time.perf_counter())
+        stages = dict(zip(("capture", "standardize", "infer"), np.diff(times)))
+        return pts, result, stages
+
+    def pollResults(self):
+        # Tk thread: shows results of the worker thread
+        while not self.results.empty():
+            kind, *result = self.results.get()
+            if kind == "live":
+                self.showLive(*result)
+            elif kind == "error":
+                self.showError(*result)
+            else:
+                self.showResult(*result)
+        self.master.after(self.pollInterval, self.pollResults)
+
+    def showResult(self, pts, result, stages, start):
+        # Updates text with classified digit
+        if result is not None:
             numResult = valueOfVector(result)
             self.updateText(str(numResult))
+            # Position of the digit just inserted, for menuCorrect
+            self.lastSample = (pts, self.textField.index("end-2c"))
             if testmode:
                 print(result)
                 print("Number =", numResult)
@@ -195,11 +293,42 @@ class Gui:
                 # self.numberid += 1
                 # print("next number:", int(self.numberid / 10))
         if testmode:
+            stages["total"] = time.perf_counter() - start
+            self.status.config(text="   ".join("%s %.1f ms" % (stage, 1000 * seconds)
+                                               for stage, seconds in stages.items()), fg="black")
             displayPoints(pts)
+        else:
+            # Clears the last error, now that classifying works again
+            self.status.config(text="")
+
+    def showError(self, kind, message):
+        # Shows an error of the worker or fine-tuning thread; kind is the request ("live", "strokes") or "fineTune"
+        if kind == "live":
+            self.livePending = False
+        self.status.config(text=message, fg="red")
+
+    def showLive(self, pts, result, digitId, start):
+        # Shows the top 3 digits of a live prediction, and ends the digit early if the network is confident enough
+        self.livePending = False
+        if result is None or digitId != self.digitId or not self.strokes:
+            return
+        shares = result[:, 0] / result[:, 0].sum()
+        top = np.argsort(-shares)[:3]
+        self.liveLabel.config(text="   ".join("%d  %.0f%%" % (digit, 100 * shares[digit]) for digit in top))
+        digit = top[0]
+        streak = self.liveStreak[1] + 1 if self.liveStreak[0] == digit else 1
+        self.liveStreak = (digit, streak)
+        if self.earlyCommit.get() and shares[digit] >= self.commitConfidence and streak >= self.commitAgreement:
+            self.master.after_cancel(self.drawTimer)
+            self.inputEnd()
 
     def resetPoints(self):
         self.canvas.delete(ALL)
-        self.drawnPoints = np.zeros((self.screenHeight, self.screenWidth))
+        self.strokes = []
+        self.live.reset()
+        self.liveStreak = (None, 0)
+        self.digitId += 1
+        self.liveLabel.config(text="")
 
     def menuNew(self):
         self.resetPoints()
@@ -257,12 +386,51 @@ class Gui:
     def menuFast(self):
         self.resetTime = 150
 
+    def menuOnlineLearning(self):
+        # Starts or stops fine-tuning the network on corrected digits in the background
+        if self.onlineLearning.get():
+            self.sampleStore = SampleStore(self.sampleStoreName or "mycorrections.pkl.gz")
+            self.fineTuner = FineTuner(self.network, self.sampleStore, self.setNetwork,
+                                       error=lambda message: self.results.put(("error", "fineTune", message)))
+        elif self.fineTuner is not None:
+            self.fineTuner.stop()
+            self.fineTuner = None
+
+    def menuCorrect(self):
+        # Replaces the last classified digit with the correct one; with online learning on, it is also learned from
+        if self.lastSample is None:
+            return
+        digit = tkinter.simpledialog.askinteger("Correct Last Digit", "Correct digit:", minvalue=0, maxvalue=9,
+                                                parent=self.master)
+        if digit is None:
+            return
+        pts, index = self.lastSample
+        self.textField.delete(index)
+        self.textField.insert(index, str(digit))
+        if self.fineTuner is not None:
+            self.sampleStore.add(pts, digit)
+
+    def setNetwork(self, network):
+        # Called by the fine-tuning thread; the worker thread uses the new network from its next digit on
+        self.network = network
+
+
+def centerCursor():
+    # Moves the mouse to the middle of the screen to start drawing from; only possible on windows (win32api)
+    try:
+        import win32api
+    except ImportError:
+        return
+    win32api.SetCursorPos((920, 400))
+
 
 def displayPoints(points):
     """
     Displays points array as an image using matplotlib.pyplot; for testing
     :param points: np.array with size (784, 1)
     """
+    # Imported here since matplotlib is slow to import and only needed in testmode
+    import matplotlib.pyplot as plt
     imgplot = plt.imshow(points.reshape((28, 28)), interpolation="none")
     imgplot.set_cmap("Greys")
     plt.show()
@@ -293,35 +461,53 @@ def evaluate(network, testData):
     :param testData: data to evaluate network over
     :return: accuracy of network as float between 0 and 100
     """
-    accuracy = 0.0
-    length = len(testData)
-    for x in testData:
-        output = network.feedforward(x[0])
-        if output.max() == output[x[1]]:
-            accuracy += 1 / length
-    accuracy *= 100
+    testData = mnistLoader.asDataset(testData)
+    correct, total = network.evaluateBatch(testData.images, testData.labels)
+    accuracy = 100 * correct / total
     print(accuracy, "% correct")
     return accuracy
 
 
-def loadNetwork(name, trainingData=None, valiData=None):
+def findNetwork(name):
+    """
+    :param name: name of saved network file, or name a network was trained under (saved as name + "_" + accuracy)
+    :return: name if that file exists, else the most accurate network saved under name, else None
+    """
+    if os.path.isfile(name):
+        return name
+    directory, base = os.path.split(name)
+    suffixes = [file[len(base) + 1:] for file in os.listdir(directory or ".") if file.startswith(base + "_")]
+    suffixes = [suffix for suffix in suffixes if suffix.isdigit()]
+    if not suffixes:
+        return None
+    return name + "_" + max(suffixes, key=int)
+
+
+def loadNetwork(name, trainingData=None, valiData=None, augmentation=None, resume=False):
     """
-    Loads network from file, if it exists, or trains and returns new network
-    :param name: name of saved network file or name to be saved as
+    Loads network from file, if it exists (see findNetwork), or trains and returns new network
+    :param name: name of saved network file or name to be saved as (with its accuracy appended)
     :param trainingData: data on which to train network
     :param valiData: data on which to continuously monitor accuracy of network
+    :param augmentation: applied to each training minibatch, eg imageTranslator.Translator() in place of expanded set
+    :param resume: if True, training continues from the checkpoints of an interrupted run; otherwise they are deleted
     :return: network loaded from file or newly trained network
     """
-    try:
-        return net.loadNetwork(name)
-    except FileNotFoundError:
-        print("Training network...")
+    saved = findNetwork(name)
+    if saved is not None:
+        return net.loadNetwork(saved)
+    print("Training network...")
     if trainingData is None:
         print("No training data input")
         raise AttributeError
     network = net.Network(np.array([784, 100, 10]))
     # gradientDescent(trainingData, number of epochs, size of minibatch, eta [ie learning rate])
-    network.gradientDescent(trainingData, 30, 10, 0.1, valiData=valiData)
+    # Checkpoints are kept in name + "_checkpoints", so an interrupted training run can continue where it stopped
+    checkpointer = Checkpointer(name + "_checkpoints")
+    if not resume:
+        checkpointer.clear()
+    network.gradientDescent(trainingData, 30, 10, 0.1, valiData=valiData, augmentation=augmentation,
+                            checkpointer=checkpointer, resume=resume)
     accuracy = evaluate(network, loadMyImages("mytestimages3_expanded.pkl.gz"))
     name = name + "_" + str(int(accuracy*100))
     network.saveNetwork(name)
@@ -333,12 +519,9 @@ def loadMyImages(name):
     """
     For loading any training or test set with images generated by this gui (doesnt need reformatting like mnist)
     :param name: name of dataset file
-    :return: dataset
+    :return: dataset as mnistLoader.Dataset
     """
-    f = gzip.open(name, "rb")
-    data = pickle.load(f, encoding="latin1")
-    f.close()
-    return data
+    return mnistLoader.loadMyImages(name)
 
 
 def initRoot(width, height):
@@ -359,24 +542,39 @@ def initRoot(width, height):
     return root
 
 
-if True:
-    expandedTrainingData, validationData, testData = mnistLoader.load(expanded=True, short=False)
-    # for viewing sample images from mnist dataset for testing
-    viewMNIST(expandedTrainingData, 10)
-
-neuralnetwork = loadNetwork(name="mnist_exp_8520")
-
-rootHeight = 1080
-rootWidth = 1920
-root = initRoot(width=rootWidth, height=rootHeight)
-gui = Gui(root, rootWidth=rootWidth, rootHeight=rootHeight, network=neuralnetwork)
-root.mainloop()  # makes root appear
-
-# For generating new image sets:
-# if testmode:
-#     myimages = gui.myimages
-#     if gui.numberid == 100:
-#         f = gzip.open("mytrainimages3.pkl.gz", "w")
-#         pickle.dump(myimages, f)
-#         f.close()
-#         print("saved")
+def main(name="mnist_exp_8520_converted", resume=False):
+    """
+    Starts the application
+    :param name: name of saved network file; trained (and saved) first if it does not exist
+    :param resume: see loadNetwork
+    """
+    trainingData = validationData = None
+    if testmode or findNetwork(name) is None:
+        # Translated images are made while training (see imageTranslator) instead of loading the 250k expanded set
+        trainingData, validationData, testData = mnistLoader.load(expanded=False, short=False)
+    if testmode:
+        # for viewing sample images from mnist dataset for testing
+        viewMNIST(trainingData, 10)
+
+    neuralnetwork = loadNetwork(name, trainingData, validationData, augmentation=Translator(), resume=resume)
+
+    rootHeight = 1080
+    rootWidth = 1920
+    root = initRoot(width=rootWidth, height=rootHeight)
+    gui = Gui(root, rootWidth=rootWidth, rootHeight=rootHeight, network=neuralnetwork)
+    root.mainloop()  # makes root appear
+    if gui.fineTuner is not None:
+        gui.fineTuner.stop()
+
+    # For generating new image sets:
+    # if testmode:
+    #     myimages = gui.myimages
+    #     if gui.numberid == 100:
+    #         f = gzip.open("mytrainimages3.pkl.gz", "w")
+    #         pickle.dump(myimages, f)
+    #         f.close()
+    #         print("saved")
+
+
+if __name__ == "__main__":
+    main()
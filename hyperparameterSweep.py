@@ -0,0 +1,172 @@
+# Sanjay Mohan
+# Grid or random search over network layout, epochs, minibatch size and learning rate, trained in parallel
+# Each configuration trains in its own process of a pool. Workers open the data sets through datasetCache, so all of
+# them share the same read-only memory-mapped pages instead of each holding a copy. Every finished configuration's
+# result (json) and network (modelFormat) are saved under the hash of the configuration, so a re-run only trains
+# configurations it has not seen before.
+
+import contextlib
+import hashlib
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from NeuralNet import mnistLoader
+from NeuralNet import net
+
+
+# Defaults of settings a configuration may leave out
+defaults = {"data": "standard", "layout": [784, 100, 10], "epochs": 30, "minibatchSize": 10, "lrnRate": 0.5,
+            "activations": "sigmoid", "cost": "quadratic", "seed": 0}
+
+
+def grid(**options):
+    """
+    Every combination of the options, eg grid(lrnRate=[0.1, 0.5], layout=[[784, 30, 10], [784, 100, 10]])
+    :param options: setting name: list of values
+    :return: list of configuration dicts
+    """
+    names = list(options)
+    return [dict(zip(names, values)) for values in itertools.product(*options.values())]
+
+
+def randomSearch(count, seed=None, **options):
+    """
+    count randomly drawn configurations
+    :param options: setting name: list of values to choose from, or (low, high) tuple to draw from log-uniformly
+    (eg lrnRate=(0.01, 1.0)); integer bounds give integers
+    :return: list of configuration dicts
+    """
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(count):
+        config = {}
+        for name, values in options.items():
+            if isinstance(values, tuple):
+                value = float(np.exp(rng.uniform(np.log(values[0]), np.log(values[1]))))
+                config[name] = int(round(value)) if all(isinstance(v, int) for v in values) else value
+            else:
+                config[name] = values[rng.integers(len(values))]
+        configs.append(config)
+    return configs
+
+
+def completeConfig(config):
+    # config with defaults filled in and values converted to plain json types
+    config = dict(defaults, **config)
+    config["layout"] = [int(n) for n in config["layout"]]
+    return config
+
+
+def configHash(config):
+    # Identifies a configuration (with defaults filled in) independently of the order of its settings
+    text = json.dumps(completeConfig(config), sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+# Data sets opened by this worker process, by name
+workerData = {}
+
+
+def workerDatasets(name):
+    # Training and validation Datasets of a data set ("standard", "expanded" or "short"), opened once per process
+    if name not in workerData:
+        with contextlib.redirect_stdout(io.StringIO()):
+            training, validation, _ = mnistLoader.loadData(expanded=name == "expanded", short=name == "short")
+        workerData[name] = training, validation
+    return workerData[name]
+
+
+def trainConfig(task):
+    # Pool worker: trains one configuration and saves its network and result; returns the result
+    config, directory = task
+    key = configHash(config)
+    training, validation = workerDatasets(config["data"])
+    np.random.seed(config["seed"])
+    network = net.Network(config["layout"], activations=config["activations"], cost=config["cost"])
+    with contextlib.redirect_stdout(io.StringIO()):
+        history = network.gradientDescent(training, config["epochs"], config["minibatchSize"], config["lrnRate"],
+                                          valiData=validation, seed=config["seed"])
+        network.saveNetwork(os.path.join(directory, key))
+    result = {"hash": key, "config": config, "accuracy": history["accuracy"][-1], "history": history}
+    # Result is written last, so its existence means the configuration is complete
+    with open(os.path.join(directory, key + ".json"), "w") as file:
+        json.dump(result, file)
+    return result
+
+
+class Sweep:
+
+    def __init__(self, directory="sweeps", processes=None):
+        """
+        :param directory: where results and networks are cached; reused by later sweeps
+        :param processes: number of configurations trained at once; defaults to the number of cpus
+        """
+        self.directory = directory
+        self.processes = processes or multiprocessing.cpu_count()
+        os.makedirs(directory, exist_ok=True)
+
+    def cached(self, config):
+        # Saved result of config, or None if it has not been trained
+        path = os.path.join(self.directory, configHash(config) + ".json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as file:
+            return json.load(file)
+
+    def network(self, result):
+        # Loads the trained network of a result
+        return net.loadNetwork(os.path.join(self.directory, result["hash"]))
+
+    def run(self, configs):
+        """
+        Trains every configuration that is not already cached
+        :param configs: list of configuration dicts (eg from grid or randomSearch); missing settings use defaults
+        :return: results of all configs, best validation accuracy first
+        """
+        configs = [completeConfig(config) for config in configs]
+        # Duplicates are trained once
+        configs = list({configHash(config): config for config in configs}.values())
+        results = [result for result in map(self.cached, configs) if result is not None]
+        remaining = [config for config in configs if self.cached(config) is None]
+        print(len(results), "of", len(configs), "configurations cached;", len(remaining), "to train")
+        if remaining:
+            start = time.perf_counter()
+            # Opened here first so each cache is built once, not by several workers at the same time
+            for name in {config["data"] for config in remaining}:
+                workerDatasets(name)
+            # Longest configurations start first so the pool is not left waiting on one at the end
+            remaining.sort(key=lambda config: -config["epochs"] * np.prod(config["layout"][:2]))
+            with multiprocessing.Pool(min(self.processes, len(remaining))) as pool:
+                tasks = [(config, self.directory) for config in remaining]
+                for result in pool.imap_unordered(trainConfig, tasks):
+                    results.append(result)
+                    print("%s %6.2f%%  %s" % (result["hash"], result["accuracy"], describe(result["config"])))
+            print("Trained", len(remaining), "configurations in", round(time.perf_counter() - start, 2), "s")
+        results.sort(key=lambda result: -result["accuracy"])
+        return results
+
+
+def describe(config):
+    return "data=%s layout=%s epochs=%d minibatchSize=%d lrnRate=%g" % (
+        config["data"], "-".join(map(str, config["layout"])), config["epochs"], config["minibatchSize"],
+        config["lrnRate"])
+
+
+def report(results, count=10):
+    # Prints the count best results
+    print("%-8s %-18s %s" % ("accuracy", "hash", "configuration"))
+    for result in results[:count]:
+        print("%7.2f%% %-18s %s" % (result["accuracy"], result["hash"], describe(result["config"])))
+
+
+if __name__ == "__main__":
+    # The comparisons networktesting.py made by hand, as one sweep
+    sweep = Sweep()
+    report(sweep.run(grid(data=["standard", "expanded", "short"], layout=[[784, 30, 10], [784, 100, 10]],
+                          lrnRate=[0.1, 0.5])))
@@ -26,36 +26,97 @@ def standardize(img):
     return img3
 
 
+def rasterize(segments, width, height):
+    """
+    Draws recorded strokes into a buffer only as big as their bounding box (standardize only depends on the
+    positions of points relative to each other, so the result is the same as for a screen-sized image)
+    :param segments: list of (x0, y0, x1, y1) screen coords of mouse movements; the pixels from (x0, y0) up to but not
+    including (x1, y1) are filled in, to fill gaps left by quick movements
+    :param width: width of the drawing area; points outside of it are dropped
+    :param height: height of the drawing area
+    :return: 2d np.array with filled pixels set to 0.98
+    """
+    x, y = segmentPixels(segments, width, height)
+    if len(x) == 0:
+        return np.zeros((1, 1))
+    img = np.zeros((y.max() - y.min() + 1, x.max() - x.min() + 1))
+    img[y - y.min(), x - x.min()] = 0.98
+    return img
+
+
+def segmentPixels(segments, width, height):
+    """
+    :param segments: list of (x0, y0, x1, y1) screen coords of mouse movements, as in rasterize
+    :param width: width of the drawing area; points outside of it are dropped
+    :param height: height of the drawing area
+    :return: x-coords and y-coords of the pixels filled in by the segments, as int np.arrays
+    """
+    segments = np.array(segments, dtype=float).reshape((-1, 4))
+    dx = segments[:, 2] - segments[:, 0]
+    dy = segments[:, 3] - segments[:, 1]
+    maxDist = np.maximum(np.abs(dx), np.abs(dy)).astype(int)
+    # pt = 0, 1, ..., maxDist - 1 for every segment, with each segment's values repeated alongside
+    counts = maxDist
+    pt = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    maxDist, dx, dy = np.repeat(maxDist, counts), np.repeat(dx, counts), np.repeat(dy, counts)
+    x = np.trunc(pt / maxDist * dx + np.repeat(segments[:, 0], counts)).astype(int)
+    y = np.trunc(pt / maxDist * dy + np.repeat(segments[:, 1], counts)).astype(int)
+    # python - where compound inequalities exist! (but not for np.arrays)
+    inside = (0 <= x) & (x < width) & (0 <= y) & (y < height)
+    return x[inside], y[inside]
+
+
 def shrink(img):
     """
     :param img: 2d np.array representing preprocessed image
     :return: (784, 1)d np.array representing smaller, centered image of parameter
     """
-    lowestX, lowestY, highestX, highestY = findExtrema(img)
-    maxY = len(img)
-    maxX = len(img[0])
-    # If the extrema were not changed from default values, there are no nonzero values in img
-    if lowestX == maxX and lowestY == maxY and highestX == -1 and highestY == -1:
+    # Crop to the rows and columns containing nonzero values first, so the full image is only scanned by any()
+    rows = np.flatnonzero(img.any(axis=1))
+    if len(rows) == 0:
         return np.zeros((784, 1))
+    cols = np.flatnonzero(img[rows[0]:rows[-1] + 1].any(axis=0))
+    # nonzero() lists points in the same (row by row) order as a loop over y, x would
+    ys, xs = np.nonzero(img[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1])
+    ys += rows[0]
+    xs += cols[0]
+    vals = img[ys, xs]
+    # Bounding box of the positive points, as in findExtrema
+    positive = vals > 0
+    # If there are no positive values in img there is nothing to shrink
+    if not positive.any():
+        return np.zeros((784, 1))
+    lowestX, highestX = int(xs[positive].min()), int(xs[positive].max())
+    lowestY, highestY = int(ys[positive].min()), int(ys[positive].max())
+    img2 = np.zeros((784, 1))
+    scatterScaled(img2, xs, ys, vals, (lowestX, lowestY, highestX, highestY))
+    return img2
+
+
+def scatterScaled(img2, xs, ys, vals, box):
+    """
+    Scales points so their bounding box fills the middle 20x20 pixels of a 28x28 image, and writes them into it
+    :param img2: (784, 1) np.array to write into
+    :param xs: x-coords of points
+    :param ys: y-coords of points
+    :param vals: values of points
+    :param box: bounding box of the points as (lowest x, lowest y, highest x, highest y)
+    """
+    lowestX, lowestY, highestX, highestY = box
     # max() to avoid later divide-by-zero (eg if the image is a straight line, one dimension would otherwise be 0)
     imgWidth = max(highestX - lowestX, 1)
     imgHeight = max(highestY - lowestY, 1)
     # Divide by largest side of bounding box, multiply by 20 to get image with 20x20 bounding square
     # The image (ie nonzero pixel values) is 20x20 but will be recorded in a 28x28 image shaped as (784, 1) vector
     scaleFactor = 20 / max(imgHeight, imgWidth)
-    img2 = np.zeros((784, 1))
-    for y in range(maxY):
-        for x in range(maxX):
-            val = img[y, x]
-            if val != 0:
-                # Scales down by mutiplying position relative to center axes of image by scaleFactor determined above
-                newYPos = (y - lowestY - imgHeight / 2) * scaleFactor
-                newXPos = (x - lowestX - imgWidth / 2) * scaleFactor
-                # Center the image
-                newYPos = int(newYPos + 14)
-                newXPos = int(newXPos + 14)
-                img2[newYPos * 28 + newXPos] = val
-    return img2
+    # Scales down by mutiplying position relative to center axes of image by scaleFactor determined above
+    newYPos = (ys - lowestY - imgHeight / 2) * scaleFactor
+    newXPos = (xs - lowestX - imgWidth / 2) * scaleFactor
+    # Center the image; np.trunc rounds towards zero just like int()
+    newYPos = np.trunc(newYPos + 14).astype(int)
+    newXPos = np.trunc(newXPos + 14).astype(int)
+    # Scatter all points at once; where several points land on one pixel the last one wins, as in a loop
+    img2[newYPos * 28 + newXPos, 0] = vals
 
 
 def findExtrema(img):
@@ -66,21 +127,13 @@ def findExtrema(img):
     """
     maxY = len(img)
     maxX = len(img[0])
-    lowestX = maxX
-    lowestY = maxY
-    highestX = highestY = -1
-    for y in range(maxY):
-        for x in range(maxX):
-            if img[y, x] > 0:
-                if y < lowestY:
-                    lowestY = y
-                if x < lowestX:
-                    lowestX = x
-                if y > highestY:
-                    highestY = y
-                if x > highestX:
-                    highestX = x
-    return lowestX, lowestY, highestX, highestY
+    filled = img > 0
+    # Rows and columns containing at least one point
+    rows = np.flatnonzero(filled.any(axis=1))
+    if len(rows) == 0:
+        return maxX, maxY, -1, -1
+    cols = np.flatnonzero(filled[rows[0]:rows[-1] + 1].any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]), int(rows[-1])
 
 
 def makeBorder(img):
@@ -89,24 +142,73 @@ def makeBorder(img):
     :param img: np.array((784, 1))
     :return: np.array((784, 1)) with new shiny grey border!
     """
+    img = np.reshape(img, 784)
     img2 = np.zeros((784, 1))
     greyValue = 0.4
-    for i in range(784):
-        val = img[i]
-        # move to next in loop (ie next value of i) if the point is not an original filled in point
-        if val != 0.98:
-            continue
-        img2[i] = val
-        # if not on left edge and point to left == 0; (i+1) because i starts at 0
-        if (i+1) % 28 != 1 and img[i-1] == 0:
-            img2[i-1] = greyValue
-        # if not on right edge and point to right == 0
-        if (i+1) % 28 != 0 and i < 783 and img[i+1] == 0:
-            img2[i+1] = greyValue
-        # if not on top edge and point above == 0
-        if i > 28 and img[i-28] == 0:
-            img2[i-28] = greyValue
-        # if not on bottom edge and point below == 0
-        if i < 756 and img[i+28] == 0:
-            img2[i+28] = greyValue
+    # Only original filled in points (0.98) are kept and get a border
+    filled = np.flatnonzero(img == 0.98)
+    img2[filled, 0] = 0.98
+    # Neighbours of each filled point to the left, right, above and below, and whether each neighbour is inside
+    # the image (not past the left/right edge, i > 28 for above, i < 756 for below); neighbours == 0 become grey
+    for neighbours, valid in ((filled - 1, filled % 28 != 0),
+                              (filled + 1, (filled % 28 != 27) & (filled < 783)),
+                              (filled - 28, filled > 28),
+                              (filled + 28, filled < 756)):
+        neighbours = neighbours[valid]
+        img2[neighbours[img[neighbours] == 0], 0] = greyValue
     return img2
+
+
+class IncrementalRasterizer:
+
+    def __init__(self, width, height):
+        """
+        Keeps the pixels and bounding box of a digit as it is drawn, so its standardized image is available at any
+        time without going over the whole drawing again; image() is the same as standardize(rasterize(segments))
+        :param width: width of the drawing area
+        :param height: height of the drawing area
+        """
+        self.width = width
+        self.height = height
+        self.reset()
+
+    def reset(self):
+        self.xs = []  # np.arrays of pixel coords, one per add
+        self.ys = []
+        self.count = 0  # number of pixels
+        self.box = None  # (lowest x, lowest y, highest x, highest y)
+        self.shrunk = np.zeros((784, 1))  # scaled image (before makeBorder) of the first self.mapped pixels
+        self.shrunkBox = None
+        self.mapped = 0
+
+    def add(self, segments):
+        # Adds pixels of segments (as in rasterize) and grows the bounding box
+        x, y = segmentPixels(segments, self.width, self.height)
+        if len(x) == 0:
+            return
+        self.xs.append(x)
+        self.ys.append(y)
+        self.count += len(x)
+        box = (int(x.min()), int(y.min()), int(x.max()), int(y.max()))
+        if self.box is not None:
+            box = (min(box[0], self.box[0]), min(box[1], self.box[1]), max(box[2], self.box[2]),
+                   max(box[3], self.box[3]))
+        self.box = box
+
+    def image(self):
+        """
+        :return: standardized (784, 1) np.array of the pixels so far, or None if fewer than 2 pixels were drawn
+        """
+        if self.count <= 1:
+            return None
+        xs, ys = np.concatenate(self.xs), np.concatenate(self.ys)
+        self.xs, self.ys = [xs], [ys]
+        if self.box != self.shrunkBox:
+            # Bounding box changed, so every pixel moves in the scaled image
+            self.shrunk[:] = 0
+            self.mapped = 0
+            self.shrunkBox = self.box
+        # Only pixels added since the last call are scaled and written
+        scatterScaled(self.shrunk, xs[self.mapped:], ys[self.mapped:], 0.98, self.box)
+        self.mapped = len(xs)
+        return makeBorder(self.shrunk)
@@ -0,0 +1,68 @@
+# Sanjay Mohan
+# On-the-fly augmentation of training images by translation
+# Replaces the materialized 250k expanded mnist set: each minibatch is translated with array slicing while training,
+# so every epoch sees freshly translated images and nothing has to be saved to or loaded from disk
+
+import numpy as np
+
+
+# (dx, dy) of a one pixel shift in each direction; y increases downwards as in the images
+directionSteps = {"left": (-1, 0), "right": (1, 0), "up": (0, -1), "down": (0, 1)}
+
+
+class Translator:
+
+    def __init__(self, shifts=(2,), directions=("left", "right", "up", "down"), probability=0.8, seed=None):
+        """
+        Randomly translates images of a minibatch; pass to Network.gradientDescent as augmentation
+        Defaults match mnistLoader.createExpandedSet, where 4 of every 5 images are shifted 2 px in one direction
+        :param shifts: numbers of pixels an image may be shifted by (should be < 5 to prevent loss of data at borders)
+        :param directions: any of "left", "right", "up", "down"
+        :param probability: chance that any one image is translated; the rest are left as they are
+        :param seed: seed of the random generator, for repeatable augmentation
+        """
+        for direction in directions:
+            if direction not in directionSteps:
+                raise ValueError("Unknown direction: ", direction)
+        if not 0 <= probability <= 1:
+            raise ValueError("Probability must be between 0 and 1")
+        self.shifts = list(shifts)
+        self.directions = list(directions)
+        self.probability = probability
+        self.rng = np.random.default_rng(seed)
+
+    def __call__(self, images):
+        """
+        :param images: (m, 784) np.array with one image per row; not modified
+        :return: (m, 784) np.array of images, each translated with chance self.probability
+        """
+        m = len(images)
+        chosen = np.flatnonzero(self.rng.random(m) < self.probability)
+        if len(chosen) == 0:
+            return images
+        output = np.array(images)
+        # Pick a (direction, shift) pair for each chosen image, then translate all images with the same pair at once
+        pairs = self.rng.integers(len(self.directions) * len(self.shifts), size=len(chosen))
+        for pair in np.unique(pairs):
+            direction = self.directions[pair // len(self.shifts)]
+            n = self.shifts[pair % len(self.shifts)]
+            dx, dy = directionSteps[direction]
+            group = chosen[pairs == pair]
+            output[group] = translate(images[group], dx * n, dy * n)
+        return output
+
+
+def translate(images, dx, dy):
+    """
+    Shifts every image by the same amount; pixels shifted past the border are lost and uncovered pixels are 0
+    :param images: (m, 784) np.array with one image per row
+    :param dx: pixels to shift right (negative shifts left)
+    :param dy: pixels to shift down (negative shifts up)
+    :return: (m, 784) np.array of translated images
+    """
+    images = np.reshape(images, (-1, 28, 28))
+    translated = np.zeros_like(images)
+    # Source and destination ranges of rows (y) and columns (x) that stay within the 28x28 frame
+    translated[:, max(dy, 0):28 + min(dy, 0), max(dx, 0):28 + min(dx, 0)] = \
+        images[:, max(-dy, 0):28 + min(-dy, 0), max(-dx, 0):28 + min(-dx, 0)]
+    return translated.reshape((-1, 784))
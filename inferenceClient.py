@@ -0,0 +1,115 @@
+# Sanjay Mohan
+# Client and load generator for inferenceServer
+# Usage: python -m NeuralNet.inferenceClient [--port 8520 | --unix /tmp/digits.sock] --concurrency 16 --requests 2000
+
+import argparse
+import http.client
+import json
+import socket
+import threading
+import time
+
+from NeuralNet import mnistLoader
+from NeuralNet.inferenceServer import latencyStats
+
+
+class TCPConnection(http.client.HTTPConnection):
+
+    def connect(self):
+        # Headers and body are sent separately; without TCP_NODELAY the body can wait for a delayed ack
+        http.client.HTTPConnection.connect(self)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, path):
+        http.client.HTTPConnection.__init__(self, "localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+def connect(host="127.0.0.1", port=8520, unixSocket=None):
+    # Connection that can be reused for many requests
+    if unixSocket:
+        return UnixHTTPConnection(unixSocket)
+    return TCPConnection(host, port)
+
+
+def request(connection, method, path, body=None):
+    data = None if body is None else json.dumps(body)
+    connection.request(method, path, data, {"Content-Type": "application/json"})
+    response = connection.getresponse()
+    content = json.loads(response.read())
+    if response.status != 200:
+        raise ValueError(content["error"])
+    return content
+
+
+def classify(connection, pixels):
+    """
+    :param pixels: 784 values of a standardized image
+    :return: dict with predicted "digit" and "top" list of [digit, score]
+    """
+    return request(connection, "POST", "/classify", {"pixels": [float(p) for p in pixels]})
+
+
+def loadGenerator(images, concurrency=16, numRequests=2000, **address):
+    """
+    Sends numRequests classification requests from concurrency threads, each with its own connection
+    :param images: (N, 784) np.array of images to send, cycled through
+    :param address: host and port or unixSocket of the server
+    :return: client side latency stats and throughput, and the server's stats
+    """
+    latencies = []
+    lock = threading.Lock()
+    bodies = [[float(p) for p in image] for image in images]
+
+    def send(worker):
+        connection = connect(**address)
+        mine = []
+        for i in range(worker, numRequests, concurrency):
+            start = time.perf_counter()
+            request(connection, "POST", "/classify", {"pixels": bodies[i % len(bodies)]})
+            mine.append(time.perf_counter() - start)
+        connection.close()
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=send, args=(worker,)) for worker in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    client = latencyStats(latencies)
+    client["throughput"] = len(latencies) / elapsed
+    connection = connect(**address)
+    server = request(connection, "GET", "/stats")
+    connection.close()
+    return client, server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate load against a running inferenceServer")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8520)
+    parser.add_argument("--unix", help="path of the server's unix socket")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--images", default="datasets/mytestimages3.pkl.gz", help="data set of gui images to send")
+    args = parser.parse_args()
+    images = mnistLoader.loadMyImages(args.images).images
+    client, server = loadGenerator(images, args.concurrency, args.requests, host=args.host, port=args.port,
+                                   unixSocket=args.unix)
+    print("client: p50 %.2f ms, p99 %.2f ms, %.0f requests/s" % (client["p50"], client["p99"], client["throughput"]))
+    print("server: p50 %.2f ms, p99 %.2f ms, average batch %.1f" % (server["p50"], server["p99"],
+                                                                    server["averageBatchSize"]))
+
+
+if __name__ == "__main__":
+    main()
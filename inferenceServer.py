@@ -0,0 +1,232 @@
+# Sanjay Mohan
+# Local inference service for a saved network
+# Loads the network once and classifies digits sent over local http (tcp or a unix socket). Requests that arrive
+# close together are grouped into micro-batches so the network runs once per batch instead of once per request.
+# Usage: python -m NeuralNet.inferenceServer mnist_exp_8520_converted [--port 8520 | --unix /tmp/digits.sock]
+
+import argparse
+import collections
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from NeuralNet import net
+from NeuralNet.imageStandardizer import standardize
+
+
+class Request:
+
+    def __init__(self, pixels):
+        # pixels: (784,) np.array of a standardized image
+        self.pixels = pixels
+        self.arrival = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None  # message if the request's batch could not be classified
+
+
+class MicroBatcher:
+
+    def __init__(self, network, maxBatchSize=64, maxDelay=0.005, topK=3, historySize=10000):
+        """
+        Groups concurrent requests into batches on a background thread
+        :param network: net.Network to classify with
+        :param maxBatchSize: largest number of requests classified together
+        :param maxDelay: longest time in seconds the first request of a batch waits for others to join it
+        :param topK: number of most likely digits returned per request
+        :param historySize: number of most recent request latencies kept for percentiles
+        """
+        self.network = network
+        self.maxBatchSize = maxBatchSize
+        self.maxDelay = maxDelay
+        self.topK = topK
+        self.requests = queue.Queue()
+        self.latencies = collections.deque(maxlen=historySize)
+        self.numRequests = 0
+        self.numBatches = 0
+        self.start = time.perf_counter()
+        self.lock = threading.Lock()
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def classify(self, pixels):
+        """
+        Blocks until the request's batch has been classified
+        :param pixels: (784,) or (784, 1) np.array of a standardized image
+        :return: dict with predicted "digit" and "top" list of [digit, score]
+        :raises RuntimeError: if classifying the batch failed
+        """
+        request = Request(np.ravel(pixels))
+        self.requests.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise RuntimeError(request.error)
+        return request.result
+
+    def run(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = batch[0].arrival + self.maxDelay
+            while len(batch) < self.maxBatchSize:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self.requests.get(timeout=max(remaining, 0)) if remaining > 0
+                                 else self.requests.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.classifyBatch(batch)
+            except Exception as error:
+                # The thread keeps serving; the batch's requests get the error instead of waiting forever
+                for request in batch:
+                    request.error = "%s: %s" % (type(error).__name__, error)
+            finally:
+                for request in batch:
+                    request.done.set()
+
+    def classifyBatch(self, batch):
+        # Sets the result of every request of batch
+        predictions, topDigits, topScores = self.network.predictBatch(np.array([r.pixels for r in batch]),
+                                                                      topK=self.topK)
+        finished = time.perf_counter()
+        with self.lock:
+            self.numRequests += len(batch)
+            self.numBatches += 1
+            self.latencies.extend(finished - request.arrival for request in batch)
+        for i, request in enumerate(batch):
+            request.result = {"digit": int(predictions[i]),
+                              "top": [[int(d), float(s)] for d, s in zip(topDigits[i], topScores[i])]}
+
+    def stats(self):
+        # Latency percentiles of recent requests, throughput and average batch size since the server started
+        with self.lock:
+            result = latencyStats(list(self.latencies))
+            result["requests"] = self.numRequests
+            result["throughput"] = self.numRequests / (time.perf_counter() - self.start)
+            result["averageBatchSize"] = self.numRequests / max(self.numBatches, 1)
+        return result
+
+
+def latencyStats(latencies):
+    # p50 and p99 in ms of a list of latencies in seconds
+    if not latencies:
+        return {"p50": None, "p99": None}
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return {"p50": float(p50), "p99": float(p99)}
+
+
+def toPixels(body):
+    """
+    :param body: json request: {"pixels": 784 values of a standardized 28x28 image} or {"bitmap": 2d list of an
+    unstandardized drawing, as recorded by the gui}
+    :return: (784,) np.array
+    """
+    if not isinstance(body, dict):
+        raise ValueError("Request must be a json object")
+    if "pixels" in body:
+        pixels = np.asarray(body["pixels"], dtype=float).ravel()
+        if len(pixels) != 784:
+            raise ValueError("pixels must have 784 values")
+        return pixels
+    if "bitmap" in body:
+        bitmap = np.asarray(body["bitmap"], dtype=float)
+        if bitmap.ndim != 2:
+            raise ValueError("bitmap must be 2d")
+        return standardize(bitmap).ravel()
+    raise ValueError("Request needs pixels or bitmap")
+
+
+class Handler(BaseHTTPRequestHandler):
+    # POST /classify with a json body (see toPixels); GET /stats
+    protocol_version = "HTTP/1.1"  # keeps connections open between requests
+
+    def do_POST(self):
+        if self.path != "/classify":
+            self.reply(404, {"error": "unknown path"})
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            pixels = toPixels(body)
+        except (TypeError, ValueError) as error:  # TypeError: values that are not numbers, eg {"pixels": {}}
+            self.reply(400, {"error": str(error)})
+            return
+        try:
+            result = self.server.batcher.classify(pixels)
+        except RuntimeError as error:
+            self.reply(500, {"error": str(error)})
+            return
+        self.reply(200, result)
+
+    def do_GET(self):
+        if self.path != "/stats":
+            self.reply(404, {"error": "unknown path"})
+            return
+        self.reply(200, self.server.batcher.stats())
+
+    def reply(self, status, content):
+        data = json.dumps(content).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return str(self.client_address[0]) if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        # Logging every request would cost more than classifying it
+        pass
+
+
+class TCPHandler(Handler):
+    # Small replies are sent at once instead of waiting to be coalesced; TCP_NODELAY does not exist for unix sockets
+    disable_nagle_algorithm = True
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def makeServer(network, host="127.0.0.1", port=8520, unixSocket=None, maxBatchSize=64, maxDelay=0.005):
+    """
+    :param network: net.Network to serve
+    :param unixSocket: path of a unix socket to listen on instead of host and port
+    :return: server; call serve_forever() to start handling requests
+    """
+    if unixSocket:
+        if os.path.exists(unixSocket):
+            os.remove(unixSocket)
+        server = UnixHTTPServer(unixSocket, Handler)
+    else:
+        server = ThreadingHTTPServer((host, port), TCPHandler)
+    server.batcher = MicroBatcher(network, maxBatchSize, maxDelay)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve digit classifications from a saved network")
+    parser.add_argument("network", help="name of saved network file")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8520)
+    parser.add_argument("--unix", help="path of unix socket to listen on instead of host and port")
+    parser.add_argument("--max-batch", type=int, default=64, help="largest micro-batch")
+    parser.add_argument("--max-delay", type=float, default=5, help="latency budget for batching, in ms")
+    args = parser.parse_args()
+    server = makeServer(net.loadNetwork(args.network), args.host, args.port, args.unix, args.max_batch,
+                        args.max_delay / 1000)
+    print("Serving", args.network, "on", args.unix or "%s:%d" % (args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(server.batcher.stats()))
+
+
+if __name__ == "__main__":
+    main()
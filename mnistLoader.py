@@ -5,9 +5,12 @@
 # Written with reference to Michael Nielsen's MNIST loader module
 
 import gzip
+import os
 import pickle
 import numpy as np
-import random
+
+from NeuralNet import datasetCache
+from NeuralNet.imageTranslator import translate
 
 
 # data set file names
@@ -16,52 +19,138 @@ expandedmnist = "datasets/expandedmnist.pkl.gz"
 shortmnist = "datasets/expandedmnist_short.pkl.gz"
 
 
+class Dataset:
+
+    def __init__(self, images, labels):
+        """
+        A data set stored as one contiguous image matrix and one label vector instead of a list of tuples
+        :param images: (N, 784) np.array with one image per row; stored as float32
+        :param labels: (N,) np.array of digits (not vectorized)
+        """
+        self.images = np.ascontiguousarray(images, dtype=np.float32).reshape((-1, 784))
+        self.labels = np.ascontiguousarray(labels, dtype=np.uint8).reshape(-1)
+        if len(self.images) != len(self.labels):
+            raise ValueError("Number of images and labels do not match: ", len(self.images), len(self.labels))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, key):
+        # An int returns the (image, digit) tuple of the old list format; slices return views, not copies
+        if isinstance(key, (int, np.integer)):
+            return np.reshape(self.images[key], (784, 1)), int(self.labels[key])
+        return Dataset(self.images[key], self.labels[key])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __add__(self, other):
+        # Concatenates two data sets (eg mnist + images drawn in the gui)
+        other = asDataset(other)
+        return Dataset(np.concatenate((self.images, other.images)), np.concatenate((self.labels, other.labels)))
+
+    def permutation(self, rng=np.random):
+        """
+        Shuffles by index instead of moving images around in memory
+        :param rng: np.random module or np.random.Generator to draw the permutation from
+        :return: (N,) np.array with a random ordering of the indices of this data set
+        """
+        return rng.permutation(len(self))
+
+    def batch(self, indices, augmentation=None):
+        """
+        :param indices: indices (or slice) of the images to gather
+        :param augmentation: function applied to the gathered (m, 784) images, eg imageTranslator.Translator
+        :return: (784, m) np.array of images (one per column) and (10, m) np.array of vectorized digits
+        """
+        images = self.images[indices]
+        if augmentation is not None:
+            images = augmentation(images)
+        return np.transpose(images), self.oneHot(indices)
+
+    def oneHot(self, indices=slice(None)):
+        """
+        :param indices: indices (or slice) of the labels to vectorize
+        :return: (10, m) np.array with one vectorized digit per column
+        """
+        labels = self.labels[indices]
+        vectors = np.zeros((10, len(labels)), dtype=self.images.dtype)
+        vectors[labels, np.arange(len(labels))] = 1.0
+        return vectors
+
+
+def asDataset(data):
+    """
+    :param data: Dataset, or list of (image, digit or vectorized digit) tuples as made by the gui
+    :return: data as a Dataset
+    """
+    if isinstance(data, Dataset):
+        return data
+    images = np.array([np.ravel(x[0]) for x in data], dtype=np.float32)
+    labels = np.array([np.argmax(x[1]) if np.ndim(x[1]) else x[1] for x in data], dtype=np.uint8)
+    return Dataset(images, labels)
+
+
 def loadData(expanded, short):
     """
-    Load and open mnist or expandedmnist file. Not to be called outside of module
+    Load mnist or expandedmnist data set through its memory-mapped cache (see datasetCache). Not to be called outside
+    of module
     :param expanded: if True, returns 250k set with translations
     :param short: if True, returns 20k randomly sampled set
-    :return: pre-formatted data of data set as tuple
+    :return: training, validation and test Datasets as tuple
     """
     if expanded:
         print("Retrieving expanded mnist set")
-        file = getExpandedSet()
+        name = getExpandedSet()
     elif short:
         print("Retrieving short mnist set")
-        file = getShortSet()
+        name = getShortSet()
     else:
         print("Retrieving standard mnist set")
-        file = gzip.open(mnist, "rb")
-    training, validation, test = pickle.load(file, encoding="latin1")
-    file.close()
+        name = mnist
+    arrays = datasetCache.loadArrays(name, splitArrays)
     # python - where you can return 3 things at once!
-    return training, validation, test
+    return tuple(Dataset(arrays[part + "Images"], arrays[part + "Labels"]) for part in ("training", "validation", "test"))
+
+
+def splitArrays(data):
+    """
+    Converts the unpickled contents of an mnist style file into named arrays for datasetCache
+    :param data: (training, validation, test) tuple, each an (images, digits) tuple
+    :return: dict of name: np.array
+    """
+    arrays = {}
+    for part, (images, labels) in zip(("training", "validation", "test"), data):
+        arrays[part + "Images"] = np.asarray(images, dtype=np.float32).reshape((-1, 784))
+        arrays[part + "Labels"] = np.asarray(labels, dtype=np.uint8)
+    return arrays
+
+
+def loadMyImages(name):
+    """
+    For loading any training or test set with images generated by the gui, through its memory-mapped cache
+    :param name: name of dataset file (a list of (image, digit) tuples)
+    :return: Dataset
+    """
+    def convert(data):
+        data = asDataset(data)
+        return {"images": data.images, "labels": data.labels}
+    arrays = datasetCache.loadArrays(name, convert)
+    return Dataset(arrays["images"], arrays["labels"])
 
 
 def load(expanded=False, short=False):
     """
-    Reformat arrays of images and labels so each index of the final list contains an image and corresponding label.
     To be called outside of module.
+    Each Dataset also behaves as a list of (image, digit) tuples, eg for gui.viewMNIST
     :param expanded: if True, returns 250k set with translations
     :param short: if True, returns 20k randomly sampled set
-    :return: training data, validation data, test data as tuple
+    :return: training data, validation data, test data as tuple of Datasets
     """
     training, validation, test = loadData(expanded, short)
-    # For each image in training (list of pixels), reshape it into a 784-d array
-    trainingImages = [np.reshape(array, (784, 1)) for array in training[0]]
-    trainingLabels = [vectorize(digit) for digit in training[1]]
-    # Zip the two sets (images, labels) together into a tuple
-    trainingData = zip(trainingImages, trainingLabels)
-
-    validationImages = [np.reshape(array, (784, 1)) for array in validation[0]]
-    # Non-vectorized labels...we'll find out later why; zip images and labels
-    validationData = zip(validationImages, validation[1])
-
-    testImages = [np.reshape(array, (784, 1)) for array in test[0]]
-    testData = zip(testImages, test[1])
-
     print("Loaded data set")
-    return list(trainingData), list(validationData), list(testData)
+    return training, validation, test
 
 
 def vectorize(digit):
@@ -76,69 +165,48 @@ def vectorize(digit):
 
 def getExpandedSet():
     """
-    :return: Load and return or create and return expandedmnist.pkl.gz
+    :return: name of expandedmnist.pkl.gz, after creating it if it does not exist
     """
-    try:
-        return gzip.open(expandedmnist, "rb")
-    except FileNotFoundError:
+    if not os.path.exists(expandedmnist):
         training, validation, test = loadData(expanded=False, short=False)
         createExpandedSet(training, validation, test)
-    return gzip.open(expandedmnist, "rb")
+    return expandedmnist
 
 
 def getShortSet():
     """
-    :return: Load and return or create and return expandedmnist_short.pkl.gz
+    :return: name of expandedmnist_short.pkl.gz, after creating it if it does not exist
     """
-    try:
-        return gzip.open(shortmnist, "rb")
-    except FileNotFoundError:
+    if not os.path.exists(shortmnist):
         training, validation, test = loadData(expanded=True, short=False)
         createShortSet(training, validation, test)
-    return gzip.open(shortmnist, "rb")
+    return shortmnist
 
 
 def createExpandedSet(training, validation, test):
     """
     Saves data set with expanded training set by translating each image n pixels in each direction
-    :param training: MNIST training data to translate and save
-    :param validation: MNIST validation data to save into new file
-    :param test: MNIST test data to save into new file
+    Training with imageTranslator.Translator as augmentation gives the same translations without saving this file
+    :param training: MNIST training Dataset to translate and save
+    :param validation: MNIST validation Dataset to save into new file
+    :param test: MNIST test Dataset to save into new file
     """
     # expanded training list is 5 times as big as original
     # pixels to be translated by - should be < 5 to prevent loss of data at borders of images
     n = 2
-    newImages = []
-    length = len(training[0])
     print("Creating expanded training set")
-    for i in range(length):
-        if i % (length / 100) == 0:
-            print(i / (length / 100), "% completed expanding")
-        image = np.reshape(training[0][i], (784, 1))
-        translated1 = np.zeros(784)
-        translated2 = np.zeros(784)
-        translated3 = np.zeros(784)
-        translated4 = np.zeros(784)
-        for j in range(784):
-            if j % 28 > n:
-                translated1[j - n] = image[j]  # shift left (lower x)
-            if j % 28 < 28 - n:
-                translated2[j + n] = image[j]  # shift right (higher x)
-            if j / 28 > n:
-                translated3[j - (28 * n)] = image[j]  # shift up (lower y)
-            if j / 28 < 28 - n:
-                translated4[j + (28 * n)] = image[j]  # shift down (higher y)
-        value = training[1][i]
-        newImages.append((training[0][i], value))  # add original image
-        newImages.append((translated1, value))
-        newImages.append((translated2, value))
-        newImages.append((translated3, value))
-        newImages.append((translated4, value))
-    random.shuffle(newImages)
-    # zip(*...) is essentially inverse zip() function
-    newTraining = list(zip(*newImages))
+    newImages = np.empty((len(training), 5, 784), dtype=np.float32)
+    newImages[:, 0] = training.images  # original image
+    newImages[:, 1] = translate(training.images, -n, 0)  # shift left (lower x)
+    newImages[:, 2] = translate(training.images, n, 0)  # shift right (higher x)
+    newImages[:, 3] = translate(training.images, 0, -n)  # shift up (lower y)
+    newImages[:, 4] = translate(training.images, 0, n)  # shift down (higher y)
+    newImages = newImages.reshape((-1, 784))
+    newLabels = np.repeat(training.labels, 5)
+    order = np.random.permutation(len(newLabels))
+    newTraining = (newImages[order], newLabels[order])
     file = gzip.open(expandedmnist, "w")
-    pickle.dump((newTraining, validation, test), file)
+    pickle.dump((newTraining, (validation.images, validation.labels), (test.images, test.labels)), file)
     file.close()
     print("Completed expanding")
 
@@ -146,24 +214,17 @@ def createExpandedSet(training, validation, test):
 def createShortSet(training, validation, test):
     """
     Saves a new data set that contains a random 20k sample of training images from expanded set instead of 250k
-    :param training: MNIST expanded training data to randomly sample and save
-    :param validation: MNIST validation data to save into new file
-    :param test: MNIST test data to save into new file
+    :param training: MNIST expanded training Dataset to randomly sample and save
+    :param validation: MNIST validation Dataset to save into new file
+    :param test: MNIST test Dataset to save into new file
     """
     # Equal quantities of each digit
-    trainingData = list(zip(training[0], training[1]))
-    random.shuffle(trainingData)
-    newImages = []
+    order = training.permutation()
+    newIndices = []
     for value in range(10):
-        count = 0
-        for image in trainingData:
-            if image[1] == value:
-                newImages.append(image)
-                count += 1
-            if count >= 2000:
-                break
-    random.shuffle(newImages)
-    newTraining = list(zip(*newImages))
+        newIndices.append(order[training.labels[order] == value][:2000])
+    newIndices = np.random.permutation(np.concatenate(newIndices))
+    newTraining = (training.images[newIndices], training.labels[newIndices])
     file = gzip.open(shortmnist, "w")
-    pickle.dump((newTraining, validation, test), file)
+    pickle.dump((newTraining, (validation.images, validation.labels), (test.images, test.labels)), file)
     file.close()
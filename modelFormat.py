@@ -0,0 +1,105 @@
+# Sanjay Mohan
+# Versioned binary file format for saved networks, replacing gzipped pickles of Layer objects
+# Layout: 8 byte magic, 4 byte format version, 4 byte manifest length, json manifest, then the raw contiguous
+# arrays of every layer, each aligned to 64 bytes. The manifest describes the topology, dtype and the offset, shape
+# and dtype of each array, plus a sha256 checksum of the array data. Files are opened with np.memmap, so loading does
+# not decompress, unpickle (ie run code from the file) or even read the weights until they are used.
+
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+
+magic = b"NNETMDL\0"
+formatVersion = 1
+alignment = 64
+headerFormat = "<8sII"  # magic, format version, manifest length
+
+
+def isModelFile(name):
+    # True if name is in this format (as opposed to eg an old gzipped pickle)
+    with open(name, "rb") as file:
+        return file.read(len(magic)) == magic
+
+
+def writeModel(name, layers, dtype, **settings):
+    """
+    :param name: file name to save to; written to a temporary file first, so a failed save never leaves half a file
+    :param layers: list with one dict per layer (excluding the input layer), each with "kind" and "arrays"
+    (dict of name: np.array) and any further json-serializable settings of the layer
+    :param dtype: dtype of the network, recorded in the manifest
+    :param settings: further json-serializable settings of the network to record in the manifest (eg cost)
+    """
+    manifestLayers = []
+    buffers = []
+    offset = 0
+    for layer in layers:
+        entry = {key: value for key, value in layer.items() if key != "arrays"}
+        entry["arrays"] = {}
+        for arrayName, array in layer["arrays"].items():
+            array = np.ascontiguousarray(array)
+            offset = align(offset)
+            entry["arrays"][arrayName] = {"offset": offset, "shape": list(array.shape), "dtype": array.dtype.str}
+            buffers.append((offset, array))
+            offset += array.nbytes
+        manifestLayers.append(entry)
+    data = bytearray(offset)
+    for start, array in buffers:
+        data[start:start + array.nbytes] = array.tobytes()
+    manifest = dict(settings)
+    manifest.update({"version": formatVersion, "dtype": np.dtype(dtype).str, "layers": manifestLayers,
+                     "dataSize": len(data), "sha256": hashlib.sha256(data).hexdigest()})
+    manifestBytes = json.dumps(manifest).encode("utf-8")
+    header = struct.pack(headerFormat, magic, formatVersion, len(manifestBytes)) + manifestBytes
+    temporary = name + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(header)
+        file.write(bytes(align(len(header)) - len(header)))
+        file.write(data)
+    os.replace(temporary, name)
+
+
+def readModel(name, verify=False):
+    """
+    :param name: name of file to load
+    :param verify: if True, checks the sha256 checksum of the array data (this reads the whole file)
+    :return: manifest dict, and list with a dict of name: np.array for each layer. The arrays are copy-on-write
+    memory maps of the file: nothing is copied until an array is modified, and modifying it never changes the file
+    """
+    with open(name, "rb") as file:
+        header = file.read(struct.calcsize(headerFormat))
+        fileMagic, version, manifestLength = struct.unpack(headerFormat, header)
+        if fileMagic != magic:
+            raise ValueError("Not a saved network: ", name)
+        if version > formatVersion:
+            raise ValueError("Saved network has newer format version than supported: ", version)
+        manifest = json.loads(file.read(manifestLength).decode("utf-8"))
+    dataStart = align(len(header) + manifestLength)
+    if manifest["dataSize"] == 0:
+        data = np.zeros(0, dtype=np.uint8)
+    else:
+        data = np.memmap(name, dtype=np.uint8, mode="c", offset=dataStart, shape=(manifest["dataSize"],))
+    if verify and hashlib.sha256(data).hexdigest() != manifest["sha256"]:
+        raise ValueError("Checksum of saved network does not match, file is corrupt: ", name)
+    layers = []
+    for entry in manifest["layers"]:
+        layers.append({arrayName: np.ndarray(info["shape"], dtype=info["dtype"], buffer=data, offset=info["offset"])
+                       for arrayName, info in entry["arrays"].items()})
+    return manifest, layers
+
+
+def align(offset):
+    # Next multiple of alignment at or after offset
+    return -(-offset // alignment) * alignment
+
+
+if __name__ == "__main__":
+    # Converts old pickled networks to this format in place, eg python -m NeuralNet.modelFormat mnist_stand_4000
+    # (copy the file first to keep the pickle, as mnist_exp_8520 is kept next to mnist_exp_8520_converted)
+    import sys
+    from NeuralNet import net
+    for networkName in sys.argv[1:]:
+        net.convertNetwork(networkName)
@@ -6,179 +6,349 @@
 #  with no reference to his actual Python code.
 
 import numpy as np
-import random
 import gzip
 import pickle
-import warnings
+import time
 
-warnings.filterwarnings('error')  # handling occasional exponential overflow errors (fixed!)
+from NeuralNet.mnistLoader import asDataset
+from NeuralNet.batchLoader import MinibatchLoader
+from NeuralNet import modelFormat
+from NeuralNet.trainingMonitor import TrainingMonitor
+from NeuralNet.activations import getActivation, getCost
+from NeuralNet.optimizers import SGD
 
 
 class Network:
 
-    def __init__(self, layoutArray, layers=None):
+    def __init__(self, layoutArray, layers=None, dtype=None, activations="sigmoid", cost="quadratic"):
         """
         A simple feedforward neural network
         :param layoutArray: The topology of the network (eg [784, 10, 10] has 784 input nodes, 10 hidden nodes,
         10 output nodes, and 3 total layers)
         :param layers: the layers containing weights and biases of an already trained network
+        :param dtype: precision of weights, biases, activations and gradients; np.float64 (default for new networks)
+        or np.float32, which halves memory traffic. Layers of a trained network are converted if needed
+        :param activations: name of the activation function of every layer, or list with one name per layer (excluding
+        the input layer), eg ["sigmoid", "softmax"]; see activations
+        :param cost: name of the cost function, eg "quadratic" or "crossentropy" (learns faster, especially with a
+        softmax output layer)
         """
+        self.cost = cost
+        self.costFunctions = getCost(cost)
         if layers is None:
             self.numLayers = len(layoutArray)  # number of layers (total) in network, including input layer
             # For each layer (index) of layoutArray, make Layer with layoutArray[i] inputs and layoutArray[i+1] outputs
             # First index of layoutArray indicates number of inputs to the network, so its corresponding
             # layer does not have weights and does not need a representative instance of Layer class;
             # self.layers[0] is therefore set as None. this representation makes backpropogation clearer
-            self.layers = [Layer(layoutArray[i], layoutArray[i + 1]) for i in range(self.numLayers - 1)]
+            self.dtype = np.dtype(np.float64 if dtype is None else dtype)
+            if isinstance(activations, str):
+                activations = [activations] * (self.numLayers - 1)
+            self.layers = [Layer(layoutArray[i], layoutArray[i + 1], self.dtype, activation=activations[i])
+                           for i in range(self.numLayers - 1)]
             self.layers.insert(0, None)
         else:
             self.layers = layers
             self.numLayers = len(self.layers)
+            self.dtype = np.dtype(self.layers[1].w.dtype if dtype is None else dtype)
+            for layer in self.layers[1:]:
+                layer.setDtype(self.dtype)
 
     def feedforward(self, inputs):
         # Computes the output of the network given input
         # inputs must have length of size layoutArray[0]
-        x = inputs
+        x = np.asarray(inputs, dtype=self.dtype)
         for layer in self.layers[1:]:
             x = layer.calculate(x)
         return x
 
-    def gradientDescent(self, training, epochs, minibatchSize, lrnRate, valiData=None):
+    def gradientDescent(self, training, epochs, minibatchSize, lrnRate, valiData=None, augmentation=None, seed=None,
+                        gradients=None, callbacks=None, optimizer=None, schedule=None, targetAccuracy=None,
+                        patience=None, checkpointer=None, resume=False):
         # The gradient descent algorithm
+        # training and valiData may be mnistLoader.Datasets or lists of (image, digit) tuples
+        # augmentation (eg imageTranslator.Translator) is applied to the images of each minibatch as it is made
+        # seed fixes the order of minibatches
+        # gradients computes the summed gradients of a minibatch in place of self.backpropagation
+        # (eg parallelTraining.ParallelTrainer.backpropagation)
+        # callbacks (see trainingMonitor) receive timings and statistics of each epoch and, if they ask for them,
+        # of each minibatch; without callbacks nothing is timed
+        # optimizer (see optimizers) updates the weights and biases; plain SGD with weight decay if None
+        # schedule (see optimizers) changes the learning rate over the epochs; constant lrnRate if None
+        # Early stopping (both need valiData): training stops once accuracy reaches targetAccuracy (in %), or when
+        # accuracy has not improved for patience epochs
+        # checkpointer (see checkpoint) saves training state in the background after epochs; with resume=True,
+        # training continues from its latest checkpoint (if there is one) as if it had never stopped
+        # Returns dict with "epochs" trained, validation "accuracy" of each epoch, total "time" and "timeToTarget"
+        # (seconds until targetAccuracy was reached, or None)
         if lrnRate <= 0:
             raise ValueError("Learning Rate must be positive")
+        if (targetAccuracy is not None or patience is not None) and not valiData:
+            raise ValueError("Early stopping needs validation data")
+        training = asDataset(training)
+        trainingLength = len(training)
+        optimizer = optimizer or SGD()
+        optimizer.setup(self.layers, trainingLength)
+        # Minibatches are shuffled by index and prepared on a background thread while the network trains-this is
+        # called "stochastic" gradient descent; quickens learning through approximations
+        loader = MinibatchLoader(training, minibatchSize, augmentation, seed=seed, dtype=self.dtype)
+        monitor = TrainingMonitor(callbacks, loader, splitGradients=gradients is None)
+        if gradients is None:
+            gradients = self.backpropagation
+        history = {"epochs": 0, "accuracy": [], "time": 0.0, "timeToTarget": None}
+        bestAccuracy, bestEpoch = -1, 0
+        if checkpointer is not None and resume:
+            state = checkpointer.restore(self, optimizer, loader, augmentation)
+            if state is not None:
+                history, bestAccuracy, bestEpoch = state["history"], state["bestAccuracy"], state["bestEpoch"]
+        # Time of a resumed run includes the time before it stopped
+        start = time.perf_counter() - history["time"]
         # Repeat gradient calculation for each minibatch; repeat this whole iteration for each epoch
-        for epoch in range(epochs):
-            random.shuffle(training)
-            # Create minibatches-this is called "stochastic" gradient descent; quickens learning through approximations
-            trainingLength = len(training)
-            minibatches = []
-            first = 0
-            while first < trainingLength:
-                last = first + minibatchSize
-                if last > trainingLength:
-                    last = trainingLength
-                minibatches.append(training[first:last])
-                first = last
-            for minibatch in minibatches:
-                mbLength = len(minibatch)
-                # Calculate weight and bias gradients
-                gradient_w = []
-                gradient_b = []
-                # Initialize all gradients as 0
-                for layer in self.layers[1:]:  # input layer has no weights/biases, thus no gradients
-                    gradient_w.append(np.zeros((len(layer.w), len(layer.w[0]))))
-                    gradient_b.append(np.zeros((len(layer.b), 1)))
-                # Find average gradient
-                for input in minibatch:
-                    costGradient_w, costGradient_b = self.backpropagation(input[0], input[1])
-                    for l in range(self.numLayers - 1):
-                        gradient_w[l] += costGradient_w[l] / mbLength
-                        gradient_b[l] += costGradient_b[l] / mbLength
-                # Update weights and biases - first term is normal gradient, second promotes lower magnitude w and b
+        for epoch in range(history["epochs"], epochs):
+            monitor.epochBegin(epoch)
+            # Images and vectorized digits of the minibatch, one sample per column, so each layer is one matrix multiply
+            for batch, (inputs, expected) in enumerate(loader):
+                mbLength = len(inputs[0])
+                monitor.minibatchBegin()
+                if monitor.splitGradients:
+                    # Forward and backward passes separately, so they can be timed separately
+                    a = self.forwardPass(inputs)
+                    monitor.forwardEnd()
+                    gradient_w, gradient_b = self.backwardPass(a, expected)
+                else:
+                    gradient_w, gradient_b = gradients(inputs, expected)
+                monitor.backwardEnd()
+                # Gradients come back summed over the minibatch; divide to get the average gradient
                 for l in range(self.numLayers - 1):
-                    layer = self.layers[l+1]
-                    layer.w += -1 * lrnRate * (costGradient_w[l] + 1 * layer.w / trainingLength)
-                    layer.b += -1 * lrnRate * costGradient_b[l]
+                    gradient_w[l] /= mbLength
+                    gradient_b[l] /= mbLength
+                rate = lrnRate if schedule is None else schedule(lrnRate, epoch + batch / len(loader))
+                # Update weights and biases (in place, see optimizers)
+                optimizer.step(self.layers, gradient_w, gradient_b, rate)
+                monitor.minibatchEnd(mbLength, gradient_w, gradient_b)
+            history["epochs"] = epoch + 1
+            monitor.validationBegin()
             accuracy = ""
             # Determine accuracy on test data at end of each epoch if test data is provided
             if valiData:
-                accuracy = "Accuracy = " + str(self.evaluate(valiData)) + "%"
+                percent = self.evaluate(valiData)
+                monitor.validationEnd(percent)
+                history["accuracy"].append(percent)
+                accuracy = "Accuracy = " + str(percent) + "%"
+            monitor.epochEnd()
             print("Epoch", epoch, "complete.", accuracy)
+            reachedTarget = targetAccuracy is not None and percent >= targetAccuracy
+            if reachedTarget:
+                history["timeToTarget"] = time.perf_counter() - start
+            if valiData and percent > bestAccuracy:
+                bestAccuracy, bestEpoch = percent, epoch
+            history["time"] = time.perf_counter() - start
+            if checkpointer is not None:
+                checkpointer.epochEnd(epoch + 1, self, optimizer, loader, augmentation,
+                                      {"history": history, "bestAccuracy": bestAccuracy, "bestEpoch": bestEpoch})
+            if reachedTarget:
+                print("Reached target accuracy of", str(targetAccuracy) + "% in", round(history["timeToTarget"], 2),
+                      "s")
+                break
+            if patience is not None and epoch - bestEpoch >= patience:
+                print("No improvement for", patience, "epochs; stopping early")
+                break
+        history["time"] = time.perf_counter() - start
+        if checkpointer is not None:
+            checkpointer.wait()
+        monitor.trainingEnd()
         print("Training complete")
+        # If training spent a large part of its time waiting here, it is input-bound
+        print("Waited", round(loader.stallTime, 2), "s for minibatches; average queue depth",
+              round(loader.averageQueueDepth(), 2))
+        return history
 
     def backpropagation(self, input, expected):
-        # Returns np.arrays of cost gradients with respect to each weight and bias
-        # Feedforward, find weighted inputs and activations for each layer
-        # Weighted inputs (sum of x*w+b for a layer); each layer has "z" vector except input layer
-        z = [None]
-        # Activations (activation of weighted inputs, or initial inputs); each layer has "a" vector
-        a = [input]
+        # Returns np.arrays of cost gradients with respect to each weight and bias (in the precision of the network)
+        # input and expected may hold a whole minibatch, one sample per column (eg (784, m) and (10, m));
+        # the returned gradients are then summed over all samples in the minibatch
+        a = self.forwardPass(input)
+        return self.backwardPass(a, expected)
+
+    def forwardPass(self, input):
+        # Feedforward, find activations for each layer (activation of weighted inputs, or initial inputs);
+        # each layer has "a" vector. The weighted inputs (sum of x*w+b for a layer) are not kept, since the derivatives
+        # of the activation functions only need the activations
+        a = [np.asarray(input, dtype=self.dtype)]
         for layer in self.layers[1:]:
-            z_l = layer.w.dot(a[-1]) + layer.b
-            z.append(z_l)
-            a.append(activation(z_l))
+            a.append(layer.calculate(a[-1]))
+        return a
+
+    def backwardPass(self, a, expected):
+        # Gradients from the activations a found by forwardPass
         # Output error d_L from last layer
-        d_L = self.costPrime(expected, a[-1]) * activationPrime(z[-1])
+        d_L = self.costFunctions.delta(expected, a[-1], getActivation(self.layers[-1].activation))
         # Output error d_l from each layer (backpropagate)
         d = [d_L]  # d holds output errors of each layer in backwards order (L, L-1, L-2, etc.)
         for l in range(self.numLayers - 2, 0, -1):  # from second to last layer to second layer
             layer = self.layers[l + 1]  # layer 2 is in index 1, etc.
-            d_l = np.transpose(layer.w).dot(d[0]) * activationPrime(z[l])
+            d_l = getActivation(self.layers[l].activation).backward(a[l], np.transpose(layer.w).dot(d[0]))
             d.insert(0, d_l)
         # Compute gradients
         costGradient_w = []
         costGradient_b = []
         for l in range(self.numLayers - 1):
             costGradient_w.append(d[l].dot(np.transpose(a[l])))
-            costGradient_b.append(d[l])
+            costGradient_b.append(d[l].sum(axis=1, keepdims=True))
         return costGradient_w, costGradient_b
 
     def costFunction(self, expected, output):
-        # Quadratic cost function, aka mean squared error
-        return 0.5 * (np.linalg.norm(expected - output)**2)
+        # Value of the network's cost function (quadratic aka mean squared error by default)
+        return self.costFunctions.value(expected, output, getActivation(self.layers[-1].activation))
 
     def costPrime(self, expected, output):
         # Derivative of cost function with respect to output
-        return output - expected
+        return self.costFunctions.prime(expected, output, getActivation(self.layers[-1].activation))
 
     def evaluate(self, data):
         # Evaluates the accuracy of this network over param data
-        accuracy = 0.0
-        length = len(data)
-        for x in data:
-            output = self.feedforward(x[0])
-            if output.max() == output[x[1]]:
-                accuracy += 1 / length
-        return 100 * accuracy
+        data = asDataset(data)
+        correct, total = self.evaluateBatch(data.images, data.labels)
+        return 100 * correct / total
+
+    def predictBatch(self, images, chunkSize=1000, topK=1):
+        """
+        Classifies many images at once; each layer is calculated once per chunk instead of once per image
+        :param images: (N, 784) np.array with one image per row
+        :param chunkSize: number of images pushed through the network together
+        :param topK: number of highest scoring digits to return for each image; at most the number of outputs are
+        :return: predicted digits (N,), top k digits (N, k) and their output scores (N, k) as np.arrays
+        """
+        if topK < 1:
+            raise ValueError("topK must be at least 1: ", topK)
+        length = len(images)
+        predictions = np.empty(length, dtype=int)
+        topDigits = np.empty((length, topK), dtype=int)
+        topScores = np.empty((length, topK), dtype=self.dtype)
+        k = topK
+        for first in range(0, length, chunkSize):
+            last = min(first + chunkSize, length)
+            # Each column of x is one image, as in feedforward
+            scores = self.feedforward(np.transpose(images[first:last])).T
+            ranked = np.argsort(-scores, axis=1)[:, :topK]
+            k = ranked.shape[1]  # fewer than topK if the network has fewer outputs
+            predictions[first:last] = ranked[:, 0]
+            topDigits[first:last, :k] = ranked
+            topScores[first:last, :k] = np.take_along_axis(scores, ranked, axis=1)
+        return predictions, topDigits[:, :k], topScores[:, :k]
+
+    def evaluateBatch(self, images, labels, chunkSize=1000):
+        """
+        :param images: (N, 784) np.array with one image per row
+        :param labels: (N,) np.array of correct digits
+        :param chunkSize: number of images pushed through the network together
+        :return: number of correctly classified images and total number of images as ints
+        """
+        predictions = self.predictBatch(images, chunkSize)[0]
+        return int(np.count_nonzero(predictions == labels)), len(labels)
+
+    def copy(self):
+        # Returns a copy of this network with its own weights and biases (eg a snapshot during training)
+        layers = [None] + [Layer(len(layer.w[0]), layer.size, w=np.array(layer.w), b=np.array(layer.b),
+                                 activation=layer.activation) for layer in self.layers[1:]]
+        return Network(None, layers, self.dtype, cost=self.cost)
 
     def saveNetwork(self, name):
-        # Saves the layers of the network to a file with given name
-        file = gzip.open(name, "w")
-        pickle.dump(self.layers, file)
-        file.close()
+        # Saves the layers of the network to a file with given name (see modelFormat)
+        layers = [layer.modelEntry() for layer in self.layers[1:]]
+        modelFormat.writeModel(name, layers, self.dtype, cost=self.cost)
         print("Network", name, "saved")
 
 
 class Layer:
 
-    def __init__(self, prevNodes, nodes):
+    def __init__(self, prevNodes, nodes, dtype=np.float64, w=None, b=None, activation="sigmoid"):
+        # w and b are the weights and biases of an already trained layer; if None they are initialized randomly
+        # activation is the name of the layer's activation function (see activations)
         self.size = nodes
+        self.activation = activation
+        getActivation(activation)  # in case of unknown name
+        if w is not None:
+            self.w = w
+            self.b = b
+            return
         # Each row contains weights for one "node" in this layer
         # Weights initialized as floats, standard deviation sqrt(1/numinputs)
-        self.w = np.random.randn(nodes, prevNodes) / np.sqrt(prevNodes)
+        self.w = (np.random.randn(nodes, prevNodes) / np.sqrt(prevNodes)).astype(dtype)
         # Biases - one per "node" in this layer; initialized in same way as weights
-        self.b = np.random.randn(nodes, 1)
+        self.b = np.random.randn(nodes, 1).astype(dtype)
 
     def calculate(self, x):
         # Returns a vector of length self.size with results of x input to this layer
         if len(x) != len(self.w[0]):  # in case improper size of inputs are input
             raise ValueError("Incorrect size of inputs: ", len(x))
-        output = activation(self.w.dot(x) + self.b, self)  # dot product and element-wise addition
+        # dot product and element-wise addition; the activation function then works in place on the new array
+        output = getActivation(self.activation).forward(self.w.dot(x) + self.b)
         return output
 
+    def setDtype(self, dtype):
+        # Converts weights and biases to dtype (eg for a network saved in another precision); no copy if already dtype
+        self.w = self.w.astype(dtype, copy=False)
+        self.b = self.b.astype(dtype, copy=False)
 
-def activation(x, layer=None):
-    # Applies activation function to each element of x
-    try:
-        return 1.0 / (1.0 + np.exp(-x))
-    except RuntimeWarning:
-        print("OVERFLOW ERROR")
-        print("x =", x)
-        print("_____")
-        print("b =", layer.b)
-        print("_____")
-        print("w =", layer.w)
+    def modelEntry(self):
+        # This layer as saved by modelFormat
+        return {"kind": "dense", "activation": self.activation, "arrays": {"w": self.w, "b": self.b}}
 
 
-def activationPrime(x):
-    # Derivative of the above activation function
-    return activation(x) * (1 - activation(x))
+def loadNetwork(name, dtype=None, verify=False, allowPickle=False):
+    """
+    Loads network from file with given name; weights are memory-mapped, not read, until used
+    :param name: name of saved network file (modelFormat, or an old gzipped pickle if allowPickle)
+    :param dtype: if given, weights and biases are converted to it
+    :param verify: if True, checks the checksum of the file
+    :param allowPickle: if True, old gzipped pickles are loaded too; unpickling is slow and runs code from the file,
+    so they should rather be converted once with convertNetwork
+    :return: Network
+    """
+    if not modelFormat.isModelFile(name):
+        if not allowPickle:
+            raise ValueError("%s is not a modelFormat file; if it is an old pickled network, convert it with "
+                             "net.convertNetwork (python -m NeuralNet.modelFormat) or pass allowPickle=True" % name)
+        print("Warning: unpickling", name, "(convert it with net.convertNetwork to load it faster and safely)")
+        return loadPickledNetwork(name, dtype)
+    manifest, arrays = modelFormat.readModel(name, verify)
+    layers = [None]
+    for entry, layerArrays in zip(manifest["layers"], arrays):
+        activation = entry.get("activation", "sigmoid")
+        if entry["kind"] == "dense":
+            w = layerArrays["w"]
+            layers.append(Layer(len(w[0]), len(w), w=w, b=layerArrays["b"], activation=activation))
+        elif entry["kind"] == "quantized":
+            # Imported here since quantization and pruning build on this module
+            from NeuralNet.quantization import QuantizedLayer
+            layers.append(QuantizedLayer(layerArrays["qw"], layerArrays["scale"], layerArrays["b"], activation))
+        elif entry["kind"] == "sparse":
+            from NeuralNet.pruning import SparseLayer
+            layers.append(SparseLayer(layerArrays["data"], layerArrays["indices"], layerArrays["indptr"],
+                                      entry["columns"], layerArrays["b"], activation))
+        else:
+            raise ValueError("Unknown kind of layer: ", entry["kind"])
+    return Network(None, layers, np.dtype(manifest["dtype"]) if dtype is None else dtype,
+                   cost=manifest.get("cost", "quadratic"))
 
 
-def loadNetwork(name):
-    # Loads network from file with given name
+def loadPickledNetwork(name, dtype=None):
+    # Loads network saved as a gzipped pickle of its layers (the format used before modelFormat)
     file = gzip.open(name, "rb")
     layers = pickle.load(file, encoding="latin1")
     file.close()
-    return Network(None, layers)
+    for layer in layers[1:]:
+        if not hasattr(layer, "activation"):  # saved before layers had a choice of activation function
+            layer.activation = "sigmoid"
+    return Network(None, layers, dtype)
+
+
+def convertNetwork(name, newName=None):
+    """
+    Converts a network saved as a gzipped pickle to modelFormat
+    :param name: name of pickled network file
+    :param newName: name of converted file; if None, name is replaced
+    """
+    network = loadPickledNetwork(name)
+    network.saveNetwork(name if newName is None else newName)
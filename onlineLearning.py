@@ -0,0 +1,114 @@
+# Sanjay Mohan
+# Online learning for the gui: digits the user corrects are kept as samples, and a background thread fine-tunes the
+# network on them
+# Samples are (pts, digit) tuples, pts being the standardized (784, 1) image, the same format as the image sets the gui
+# makes in testmode (eg mytrainimages3.pkl.gz), so a sample store can also be used as such a set.
+# Fine-tuning trains a copy of the network, so classification keeps using the old network until the copy is done.
+
+import gzip
+import os
+import pickle
+import threading
+import time
+import traceback
+
+from NeuralNet import mnistLoader
+from NeuralNet.optimizers import SGD
+
+
+class SampleStore:
+
+    def __init__(self, name):
+        """
+        :param name: gzipped pickle file of samples; loaded if it exists, and saved to by save
+        """
+        self.name = name
+        self.lock = threading.Lock()
+        self.samples = []
+        self.saved = 0  # number of samples already in the file
+        if os.path.exists(name):
+            with gzip.open(name, "rb") as file:
+                self.samples = pickle.load(file)
+            self.saved = len(self.samples)
+
+    def add(self, pts, digit):
+        with self.lock:
+            self.samples.append((pts, int(digit)))
+
+    def __len__(self):
+        return len(self.samples)
+
+    def dataset(self):
+        # Copy of the samples as an mnistLoader.Dataset
+        with self.lock:
+            samples = list(self.samples)
+        return mnistLoader.asDataset(samples)
+
+    def save(self):
+        # Writes the file if there are new samples; written to a temporary file first, as in modelFormat
+        with self.lock:
+            samples = list(self.samples)
+        if len(samples) == self.saved:
+            return
+        temporary = self.name + ".tmp"
+        with gzip.open(temporary, "wb") as file:
+            pickle.dump(samples, file)
+        os.replace(temporary, self.name)
+        self.saved = len(samples)
+
+
+class FineTuner:
+
+    def __init__(self, network, store, update, interval=30, minSamples=5, epochs=3, minibatchSize=5, lrnRate=0.05,
+                 error=None):
+        """
+        Every interval seconds, if samples were added since the last time, trains a copy of network on all samples of
+        store in a daemon thread and passes it to update
+        :param network: net.Network to start from
+        :param store: SampleStore
+        :param update: function called (from the fine-tuning thread) with each fine-tuned net.Network
+        :param minSamples: number of samples needed before the first fine-tuning
+        :param lrnRate: kept low, since the few samples should adjust the network, not replace what it learned
+        :param error: function called (from the fine-tuning thread) with a message if saving or fine-tuning fails;
+        the thread keeps running and tries again after the next interval
+        """
+        self.network = network
+        self.store = store
+        self.update = update
+        self.interval = interval
+        self.minSamples = minSamples
+        self.epochs = epochs
+        self.minibatchSize = minibatchSize
+        self.lrnRate = lrnRate
+        self.error = error
+        self.trainedOn = 0  # number of samples the current network was fine-tuned on
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.store.save()
+                if len(self.store) >= self.minSamples and len(self.store) > self.trainedOn:
+                    self.fineTune()
+            except Exception as error:
+                traceback.print_exc()
+                if self.error is not None:
+                    self.error("Fine-tuning failed: %s: %s" % (type(error).__name__, error))
+
+    def fineTune(self):
+        samples = self.store.dataset()
+        start = time.perf_counter()
+        network = self.network.copy()
+        # No weight decay: its default strength (1 / number of samples) is far too strong for a few samples
+        network.gradientDescent(samples, self.epochs, self.minibatchSize, self.lrnRate, optimizer=SGD(weightDecay=0))
+        self.network = network
+        self.trainedOn = len(samples)
+        print("Fine-tuned on", len(samples), "samples in", round(time.perf_counter() - start, 2), "s")
+        self.update(network)
+
+    def stop(self):
+        # Stops fine-tuning and saves the samples
+        self.stopped.set()
+        self.store.save()
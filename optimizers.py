@@ -0,0 +1,171 @@
+# Sanjay Mohan
+# Optimizers and learning rate schedules for net.Network.gradientDescent
+# Optimizers update the weights and biases in place from the minibatch's average gradients, keeping any state
+# (velocities, moment estimates) in buffers allocated once per layer. Schedules scale the learning rate over training.
+
+import math
+
+import numpy as np
+
+
+class SGD:
+
+    def __init__(self, weightDecay=None):
+        """
+        Plain stochastic gradient descent: w -= lrnRate * (gradient + weightDecay * w)
+        :param weightDecay: strength of the term promoting lower magnitude weights; 1 / (training set size) if None
+        """
+        self.weightDecay = weightDecay
+
+    def setup(self, layers, trainingLength):
+        # Called by gradientDescent before training; allocates buffers the first time or when the layers changed
+        self.decay = 1 / trainingLength if self.weightDecay is None else self.weightDecay
+        shapes = [(layer.w.shape, layer.b.shape, layer.w.dtype) for layer in layers[1:]]
+        if getattr(self, "shapes", None) != shapes:
+            self.shapes = shapes
+            self.scratch = [np.empty_like(layer.w) for layer in layers[1:]]
+            self.allocate(layers)
+
+    def allocate(self, layers):
+        # Subclasses allocate their state buffers here
+        pass
+
+    def step(self, layers, gradient_w, gradient_b, lrnRate):
+        # Updates each layer in place; gradient_w and gradient_b are averages over the minibatch
+        for layer, g_w, g_b, scratch in zip(layers[1:], gradient_w, gradient_b, self.scratch):
+            np.multiply(layer.w, self.decay, out=scratch)
+            scratch += g_w
+            scratch *= lrnRate
+            layer.w -= scratch
+            layer.b -= lrnRate * g_b
+
+    def state(self):
+        # State needed to continue training exactly (eg from a checkpoint), as dict of name: list of np.arrays
+        return {}
+
+    def loadState(self, state):
+        buffers = self.state()
+        for name, arrays in state.items():
+            for buffer, array in zip(buffers[name], arrays):
+                buffer[...] = array
+
+
+class Momentum(SGD):
+
+    def __init__(self, momentum=0.9, nesterov=False, weightDecay=None):
+        """
+        Gradient descent with momentum: v = momentum * v - lrnRate * gradient; w += v
+        :param momentum: fraction of the previous velocity kept each step
+        :param nesterov: if True, uses Nesterov momentum (the update looks ahead along the velocity)
+        :param weightDecay: as in SGD
+        """
+        SGD.__init__(self, weightDecay)
+        self.momentum = momentum
+        self.nesterov = nesterov
+
+    def allocate(self, layers):
+        self.velocity_w = [np.zeros_like(layer.w) for layer in layers[1:]]
+        self.velocity_b = [np.zeros_like(layer.b) for layer in layers[1:]]
+
+    def step(self, layers, gradient_w, gradient_b, lrnRate):
+        for l, layer in enumerate(layers[1:]):
+            g_w = self.scratch[l]
+            np.multiply(layer.w, self.decay, out=g_w)
+            g_w += gradient_w[l]
+            for param, g, velocity in ((layer.w, g_w, self.velocity_w[l]), (layer.b, gradient_b[l],
+                                                                             self.velocity_b[l])):
+                velocity *= self.momentum
+                velocity -= lrnRate * g
+                if self.nesterov:
+                    # w += momentum * v - lrnRate * gradient (with the new v)
+                    param += self.momentum * velocity - lrnRate * g
+                else:
+                    param += velocity
+
+    def state(self):
+        return {"velocity_w": self.velocity_w, "velocity_b": self.velocity_b}
+
+
+class Adam(SGD):
+
+    def __init__(self, beta1=0.9, beta2=0.999, epsilon=1e-8, weightDecay=None):
+        """
+        Adam: per-weight step sizes from running averages of the gradient (m) and squared gradient (v)
+        Typically used with a much smaller lrnRate than SGD, eg 0.001
+        :param beta1: decay rate of m
+        :param beta2: decay rate of v
+        :param epsilon: keeps the step finite where v is 0
+        :param weightDecay: as in SGD
+        """
+        SGD.__init__(self, weightDecay)
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.epsilon = epsilon
+
+    def allocate(self, layers):
+        self.m = [np.zeros_like(p) for layer in layers[1:] for p in (layer.w, layer.b)]
+        self.v = [np.zeros_like(p) for layer in layers[1:] for p in (layer.w, layer.b)]
+        self.t = np.zeros(1)  # number of steps taken, as an array so it is saved and loaded like the other state
+
+    def step(self, layers, gradient_w, gradient_b, lrnRate):
+        self.t += 1
+        t = self.t[0]
+        # Bias corrections of m and v folded into the learning rate
+        rate = lrnRate * math.sqrt(1 - self.beta2 ** t) / (1 - self.beta1 ** t)
+        for l, layer in enumerate(layers[1:]):
+            g_w = self.scratch[l]
+            np.multiply(layer.w, self.decay, out=g_w)
+            g_w += gradient_w[l]
+            for i, (param, g) in enumerate(((layer.w, g_w), (layer.b, gradient_b[l]))):
+                m, v = self.m[2 * l + i], self.v[2 * l + i]
+                m *= self.beta1
+                m += (1 - self.beta1) * g
+                v *= self.beta2
+                v += (1 - self.beta2) * g * g
+                param -= rate * m / (np.sqrt(v) + self.epsilon)
+
+    def state(self):
+        return {"m": self.m, "v": self.v, "t": [self.t]}
+
+
+class StepSchedule:
+
+    def __init__(self, stepEpochs, factor=0.1):
+        # Multiplies the learning rate by factor every stepEpochs epochs
+        self.stepEpochs = stepEpochs
+        self.factor = factor
+
+    def __call__(self, lrnRate, epoch):
+        """
+        :param lrnRate: base learning rate given to gradientDescent
+        :param epoch: epochs completed so far, with fraction of the current epoch (eg 2.5 halfway through epoch 2)
+        :return: learning rate to use
+        """
+        return lrnRate * self.factor ** int(epoch // self.stepEpochs)
+
+
+class CosineSchedule:
+
+    def __init__(self, totalEpochs, minRate=0.0):
+        # Lowers the learning rate from lrnRate to minRate along half a cosine wave over totalEpochs epochs
+        self.totalEpochs = totalEpochs
+        self.minRate = minRate
+
+    def __call__(self, lrnRate, epoch):
+        progress = min(epoch / self.totalEpochs, 1.0)
+        return self.minRate + 0.5 * (lrnRate - self.minRate) * (1 + math.cos(math.pi * progress))
+
+
+class WarmupSchedule:
+
+    def __init__(self, warmupEpochs, schedule=None):
+        # Raises the learning rate linearly from 0 over warmupEpochs epochs, then follows schedule (constant if None)
+        self.warmupEpochs = warmupEpochs
+        self.schedule = schedule
+
+    def __call__(self, lrnRate, epoch):
+        if epoch < self.warmupEpochs:
+            return lrnRate * epoch / self.warmupEpochs
+        if self.schedule is None:
+            return lrnRate
+        return self.schedule(lrnRate, epoch - self.warmupEpochs)
@@ -0,0 +1,147 @@
+# Sanjay Mohan
+# Data-parallel training of a network across a pool of processes
+# Each minibatch is split into one slice per process; every process computes the gradients of its slice with the
+# weights and biases in shared memory, and the summed gradients are used for the usual update in gradientDescent
+
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from NeuralNet import net
+
+
+class ParallelTrainer:
+
+    def __init__(self, network, processes=None, maxMinibatchSize=1000):
+        """
+        While the trainer is open, the weights and biases of network live in shared memory so workers always read
+        the current values; use as a context manager (or call close()) to move them back into private memory
+        Splitting only pays off for minibatches large enough (eg 100+) that the work outweighs the cost of a round
+        trip to the pool
+        :param network: net.Network to train
+        :param processes: number of worker processes; defaults to the number of cpus
+        :param maxMinibatchSize: largest minibatch that will be passed to backpropagation
+        """
+        self.network = network
+        self.processes = processes or multiprocessing.cpu_count()
+        self.maxMinibatchSize = maxMinibatchSize
+        layout = [len(network.layers[1].w[0])] + [layer.size for layer in network.layers[1:]]
+        dtype = network.dtype
+        shapes = parameterShapes(layout)
+        # Weights and biases, the minibatch (images and vectorized digits), and one gradient slot per process
+        self.parameterMemory = createSharedMemory(shapes, dtype)
+        self.batchMemory = createSharedMemory([(784, maxMinibatchSize), (10, maxMinibatchSize)], dtype)
+        self.gradientMemory = createSharedMemory(shapes * self.processes, dtype)
+        parameters = sharedViews(self.parameterMemory, shapes, dtype)
+        for l, layer in enumerate(network.layers[1:]):
+            parameters[2 * l][:] = layer.w
+            parameters[2 * l + 1][:] = layer.b
+            layer.w, layer.b = parameters[2 * l], parameters[2 * l + 1]
+        self.inputs, self.expected = sharedViews(self.batchMemory, [(784, maxMinibatchSize), (10, maxMinibatchSize)],
+                                                 dtype)
+        gradients = sharedViews(self.gradientMemory, shapes * self.processes, dtype)
+        self.slots = [gradients[k * len(shapes):(k + 1) * len(shapes)] for k in range(self.processes)]
+        names = (self.parameterMemory.name, self.batchMemory.name, self.gradientMemory.name)
+        activations = [layer.activation for layer in network.layers[1:]]
+        self.pool = multiprocessing.Pool(self.processes, initializer=attachWorker,
+                                         initargs=(names, layout, dtype.str, activations, network.cost,
+                                                   maxMinibatchSize, self.processes))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def gradientDescent(self, training, epochs, minibatchSize, lrnRate, **kwargs):
+        # Same as net.Network.gradientDescent (takes the same keyword arguments and returns its history), with
+        # gradients computed in parallel
+        if minibatchSize > self.maxMinibatchSize:
+            raise ValueError("Minibatch size larger than maxMinibatchSize: ", minibatchSize)
+        return self.network.gradientDescent(training, epochs, minibatchSize, lrnRate, gradients=self.backpropagation,
+                                            **kwargs)
+
+    def backpropagation(self, inputs, expected):
+        """
+        Drop-in replacement for net.Network.backpropagation that splits the minibatch across the pool
+        :param inputs: (784, m) np.array of images, one per column
+        :param expected: (10, m) np.array of vectorized digits
+        :return: weight and bias gradients summed over the minibatch, as in net.Network.backpropagation
+        """
+        m = len(inputs[0])
+        self.inputs[:, :m] = inputs
+        self.expected[:, :m] = expected
+        bounds = np.linspace(0, m, min(self.processes, m) + 1).astype(int)
+        tasks = [(k, bounds[k], bounds[k + 1]) for k in range(len(bounds) - 1)]
+        self.pool.map(computeGradients, tasks)
+        # Reduce: sum the gradient slots of all processes that took part
+        used = self.slots[:len(tasks)]
+        sums = [np.sum([slot[i] for slot in used], axis=0) for i in range(len(used[0]))]
+        return sums[0::2], sums[1::2]
+
+    def close(self):
+        # Stops the workers and copies the weights and biases back out of shared memory
+        if self.pool is None:
+            return
+        self.pool.close()
+        self.pool.join()
+        self.pool = None
+        for layer in self.network.layers[1:]:
+            layer.w, layer.b = np.array(layer.w), np.array(layer.b)
+        self.inputs = self.expected = self.slots = None
+        for memory in (self.parameterMemory, self.batchMemory, self.gradientMemory):
+            memory.close()
+            memory.unlink()
+
+
+def parameterShapes(layout):
+    # Shapes of w and b of each layer, in order w1, b1, w2, b2, ...
+    shapes = []
+    for i in range(len(layout) - 1):
+        shapes += [(layout[i + 1], layout[i]), (layout[i + 1], 1)]
+    return shapes
+
+
+def createSharedMemory(shapes, dtype):
+    size = sum(int(np.prod(shape)) for shape in shapes) * np.dtype(dtype).itemsize
+    return shared_memory.SharedMemory(create=True, size=size)
+
+
+def sharedViews(memory, shapes, dtype):
+    # np.arrays of the given shapes laid out one after another in memory; no copies
+    views = []
+    offset = 0
+    for shape in shapes:
+        views.append(np.ndarray(shape, dtype=dtype, buffer=memory.buf, offset=offset))
+        offset += int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return views
+
+
+# State of a worker process, set up once by attachWorker
+worker = {}
+
+
+def attachWorker(names, layout, dtype, activations, cost, maxMinibatchSize, processes):
+    # Pool initializer: builds a network whose weights and biases are the shared ones
+    memories = [shared_memory.SharedMemory(name=name) for name in names]
+    shapes = parameterShapes(layout)
+    parameters = sharedViews(memories[0], shapes, dtype)
+    network = net.Network(layout, dtype=dtype, activations=activations, cost=cost)
+    for l, layer in enumerate(network.layers[1:]):
+        layer.w, layer.b = parameters[2 * l], parameters[2 * l + 1]
+    inputs, expected = sharedViews(memories[1], [(784, maxMinibatchSize), (10, maxMinibatchSize)], dtype)
+    gradients = sharedViews(memories[2], shapes * processes, dtype)
+    worker.update(memories=memories, network=network, inputs=inputs, expected=expected, gradients=gradients,
+                  numShapes=len(shapes))
+
+
+def computeGradients(task):
+    # Computes the gradients of columns first:last of the shared minibatch into gradient slot k
+    k, first, last = task
+    gradient_w, gradient_b = worker["network"].backpropagation(worker["inputs"][:, first:last],
+                                                               worker["expected"][:, first:last])
+    slot = worker["gradients"][k * worker["numShapes"]:(k + 1) * worker["numShapes"]]
+    for l in range(len(gradient_w)):
+        slot[2 * l][:] = gradient_w[l]
+        slot[2 * l + 1][:] = gradient_b[l]
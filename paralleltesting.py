@@ -0,0 +1,58 @@
+# Sanjay Mohan
+# Scaling report for data-parallel training (see parallelTraining)
+# Times one epoch over the expanded mnist set with 1 to N processes and reports speedup and scaling efficiency,
+# after checking that parallel training gives the same network as serial training with the same seed
+
+import multiprocessing
+import time
+
+import numpy as np
+
+from NeuralNet import mnistLoader
+from NeuralNet import net
+from NeuralNet.parallelTraining import ParallelTrainer
+
+
+def trainedNetwork(training, processes, layout, epochs, minibatchSize, lrnRate, seed):
+    # Returns the trained network and the seconds training took; processes=0 trains serially
+    np.random.seed(seed)
+    network = net.Network(layout)
+    start = time.perf_counter()
+    if processes == 0:
+        network.gradientDescent(training, epochs, minibatchSize, lrnRate, seed=seed)
+    else:
+        with ParallelTrainer(network, processes, maxMinibatchSize=minibatchSize) as trainer:
+            trainer.gradientDescent(training, epochs, minibatchSize, lrnRate, seed=seed)
+    return network, time.perf_counter() - start
+
+
+def scalingReport(training, maxProcesses=None, layout=(784, 100, 10), epochs=1, minibatchSize=500, lrnRate=0.5,
+                  seed=0, tolerance=1e-8):
+    """
+    :param training: mnistLoader.Dataset to train on
+    :param maxProcesses: largest number of processes to time; defaults to the number of cpus
+    :param tolerance: largest allowed difference between serially and parallel trained weights
+    :return: dict of processes: seconds per epoch
+    """
+    maxProcesses = maxProcesses or multiprocessing.cpu_count()
+    serial, serialTime = trainedNetwork(training, 0, list(layout), epochs, minibatchSize, lrnRate, seed)
+    times = {}
+    for processes in range(1, maxProcesses + 1):
+        network, seconds = trainedNetwork(training, processes, list(layout), epochs, minibatchSize, lrnRate, seed)
+        difference = max(np.abs(a.w - b.w).max() for a, b in zip(serial.layers[1:], network.layers[1:]))
+        if difference > tolerance:
+            raise AssertionError("Parallel training with " + str(processes) + " processes differs from serial: " +
+                                 str(difference))
+        times[processes] = seconds / epochs
+    print()
+    print("serial: %.2f s/epoch" % (serialTime / epochs))
+    print("%-10s %12s %10s %12s" % ("processes", "s/epoch", "speedup", "efficiency"))
+    for processes, seconds in times.items():
+        speedup = times[1] / seconds
+        print("%-10d %12.2f %10.2f %11.0f%%" % (processes, seconds, speedup, 100 * speedup / processes))
+    return times
+
+
+if __name__ == "__main__":
+    expandedTrainingData, validationData, testData = mnistLoader.load(expanded=True, short=False)
+    scalingReport(expandedTrainingData)
@@ -0,0 +1,52 @@
+# Sanjay Mohan
+# Benchmark of float64 against float32 networks (see the dtype parameter of net.Network)
+# Trains identically seeded networks in each precision on the mnist training set, then compares training and
+# inference throughput and accuracy on the mnist test set
+
+import time
+
+import numpy as np
+
+from NeuralNet import mnistLoader
+from NeuralNet import net
+
+
+def benchmark(dtype, training, test, layout, epochs, minibatchSize, lrnRate, seed):
+    """
+    :param dtype: precision of the network, eg np.float32
+    :param training: mnistLoader.Dataset to train on
+    :param test: mnistLoader.Dataset to measure accuracy and inference speed on
+    :return: dict of training images/s, inference images/s and test accuracy in %
+    """
+    np.random.seed(seed)  # same initial weights (before conversion to dtype) for every precision
+    network = net.Network(layout, dtype=dtype)
+    start = time.perf_counter()
+    network.gradientDescent(training, epochs, minibatchSize, lrnRate, seed=seed)
+    trainingTime = time.perf_counter() - start
+    start = time.perf_counter()
+    correct, total = network.evaluateBatch(test.images, test.labels)
+    inferenceTime = time.perf_counter() - start
+    return {"training": epochs * len(training) / trainingTime, "inference": total / inferenceTime,
+            "accuracy": 100 * correct / total}
+
+
+def compare(layout=(784, 100, 10), epochs=1, minibatchSize=10, lrnRate=0.1, seed=0):
+    # Prints throughput and accuracy of float64 and float32 networks trained the same way
+    training, validation, test = mnistLoader.load()
+    results = {}
+    for dtype in (np.float64, np.float32):
+        results[dtype] = benchmark(dtype, training, test, list(layout), epochs, minibatchSize, lrnRate, seed)
+    print()
+    print("%-8s %18s %18s %10s" % ("dtype", "training img/s", "inference img/s", "accuracy"))
+    for dtype, result in results.items():
+        print("%-8s %18.0f %18.0f %9.2f%%" % (np.dtype(dtype).name, result["training"], result["inference"],
+                                             result["accuracy"]))
+    single, double = results[np.float32], results[np.float64]
+    print("float32 speedup: training x%.2f, inference x%.2f; accuracy difference %+.2f%%" % (
+        single["training"] / double["training"], single["inference"] / double["inference"],
+        single["accuracy"] - double["accuracy"]))
+    return results
+
+
+if __name__ == "__main__":
+    compare()
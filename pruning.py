@@ -0,0 +1,194 @@
+# Sanjay Mohan
+# Magnitude pruning of trained networks, with sparse storage and inference of the pruned layers
+# The smallest weights of each layer are set to 0 until the layer reaches the target sparsity; the network can then be
+# fine-tuned with gradientDescent while the pruned weights are held at 0. Pruned layers are kept in compressed sparse
+# row (CSR) form: the nonzero weights row by row, their column indices and where each row starts.
+# Usage: python -m NeuralNet.pruning mnist_exp_8520_converted --sparsity 0.5 0.8 0.9 --epochs 1
+
+import argparse
+import contextlib
+import io
+import os
+import time
+
+import numpy as np
+
+from NeuralNet import mnistLoader
+from NeuralNet import net
+from NeuralNet.activations import getActivation
+from NeuralNet.optimizers import SGD
+
+
+def magnitudeMask(w, sparsity):
+    # Boolean np.array, False for the fraction sparsity of w with the smallest magnitudes
+    pruned = int(round(sparsity * w.size))
+    mask = np.ones(w.size, dtype=bool)
+    if pruned > 0:
+        mask[np.argpartition(np.abs(w).ravel(), pruned - 1)[:pruned]] = False
+    return mask.reshape(w.shape)
+
+
+class MaskedOptimizer:
+
+    def __init__(self, optimizer, masks):
+        """
+        Wraps an optimizer (see optimizers) so weights outside the masks stay 0 after every update
+        :param optimizer: eg optimizers.SGD()
+        :param masks: list with a boolean np.array of the shape of each layer's weights (excluding the input layer)
+        """
+        self.optimizer = optimizer
+        self.masks = masks
+
+    def setup(self, layers, trainingLength):
+        self.optimizer.setup(layers, trainingLength)
+
+    def step(self, layers, gradient_w, gradient_b, lrnRate):
+        self.optimizer.step(layers, gradient_w, gradient_b, lrnRate)
+        for layer, mask in zip(layers[1:], self.masks):
+            layer.w *= mask
+
+    def state(self):
+        return self.optimizer.state()
+
+    def loadState(self, state):
+        self.optimizer.loadState(state)
+
+
+def prune(network, sparsity, training=None, epochs=0, minibatchSize=10, lrnRate=0.1, optimizer=None, **kwargs):
+    """
+    Prunes network in place, then optionally fine-tunes it
+    :param network: trained net.Network with dense layers
+    :param sparsity: fraction (0 to 1) of the weights of each layer to set to 0
+    :param training: data to fine-tune on; no fine-tuning if None or epochs is 0
+    :param optimizer: optimizer used to fine-tune; optimizers.SGD() if None
+    :param kwargs: further arguments of gradientDescent, eg valiData
+    :return: list of the masks of the remaining weights of each layer
+    """
+    masks = [magnitudeMask(layer.w, sparsity) for layer in network.layers[1:]]
+    for layer, mask in zip(network.layers[1:], masks):
+        layer.w *= mask
+    if training is not None and epochs > 0:
+        network.gradientDescent(training, epochs, minibatchSize, lrnRate,
+                                optimizer=MaskedOptimizer(SGD() if optimizer is None else optimizer, masks), **kwargs)
+    return masks
+
+
+class SparseLayer:
+
+    def __init__(self, data, indices, indptr, columns, b, activation="sigmoid"):
+        """
+        A net.Layer with weights in compressed sparse row form, for inference only
+        :param data: np.array of the nonzero weights, row by row
+        :param indices: int np.array of the column of each weight in data
+        :param indptr: int np.array; the weights of row i are data[indptr[i]:indptr[i + 1]]
+        :param columns: number of inputs to the layer
+        :param b: (nodes, 1) np.array of biases
+        """
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.columns = columns
+        self.size = len(indptr) - 1
+        self.b = b
+        self.activation = activation
+        # Rows with weights; np.add.reduceat is only given their starts, since an empty row's start would end the
+        # sum of the row before it
+        self.nonEmpty = np.diff(indptr) > 0
+        self.starts = np.asarray(indptr[:-1])[self.nonEmpty]
+
+    def calculate(self, x):
+        # Returns a vector of length self.size with results of x input to this layer, as net.Layer.calculate
+        if len(x) != self.columns:
+            raise ValueError("Incorrect size of inputs: ", len(x))
+        output = np.zeros((self.size, x.shape[1]), dtype=np.result_type(self.data, self.b))
+        if len(self.data) > 0:
+            # Each nonzero weight times its input row, then summed over the weights of each row
+            # (rows of x are gathered, so they should be contiguous)
+            products = np.ascontiguousarray(x, dtype=self.data.dtype)[self.indices]
+            products *= self.data[:, None]
+            output[self.nonEmpty] = np.add.reduceat(products, self.starts, axis=0)
+        output += self.b
+        return getActivation(self.activation).forward(output)
+
+    def setDtype(self, dtype):
+        self.data = self.data.astype(dtype, copy=False)
+        self.b = self.b.astype(dtype, copy=False)
+
+    def modelEntry(self):
+        return {"kind": "sparse", "activation": self.activation, "columns": self.columns,
+                "arrays": {"data": self.data, "indices": self.indices, "indptr": self.indptr, "b": self.b}}
+
+
+def sparseLayer(layer):
+    # SparseLayer holding the nonzero weights of a dense net.Layer
+    rows, columns = np.nonzero(layer.w)
+    indptr = np.zeros(len(layer.w) + 1, dtype=np.int32)
+    np.cumsum(np.bincount(rows, minlength=len(layer.w)), out=indptr[1:])
+    return SparseLayer(layer.w[rows, columns], columns.astype(np.int32), indptr, layer.w.shape[1],
+                       np.array(layer.b), layer.activation)
+
+
+def sparseNetwork(network):
+    # net.Network of SparseLayers with the same weights as network (eg after prune)
+    layers = [None] + [sparseLayer(layer) for layer in network.layers[1:]]
+    return net.Network(None, layers, network.dtype, cost=network.cost)
+
+
+def imagesPerSecond(network, images, repeats=3):
+    # Fastest of repeats batched classifications of images
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        network.predictBatch(images)
+        best = min(best, time.perf_counter() - start)
+    return len(images) / best
+
+
+def report(name, datasets, sparsities=(0.5, 0.8, 0.9, 0.95), training=None, epochs=0, lrnRate=0.1):
+    """
+    Prunes a saved network to each sparsity (fine-tuning if training is given), saves each as name + "_sparse" +
+    percent, and prints accuracy, dense and sparse speed, and file size against the unpruned network
+    :param name: saved network file name
+    :param datasets: dict of name: mnistLoader.Dataset to measure accuracy on; speed is measured on the first
+    :return: dict of sparsity: dict of "accuracy" (dict of data set name: %), "dense" and "sparse" images/s and "bytes"
+    """
+    speedImages = next(iter(datasets.values())).images
+    results = {}
+    for sparsity in (0,) + tuple(sparsities):
+        network = net.loadNetwork(name)
+        fileName = name
+        with contextlib.redirect_stdout(io.StringIO()):
+            if sparsity > 0:
+                prune(network, sparsity, training, epochs, lrnRate=lrnRate)
+                fileName = name + "_sparse" + str(int(round(100 * sparsity)))
+                sparseNetwork(network).saveNetwork(fileName)
+        # Reloaded, so the measured network is the one that was saved
+        sparse = net.loadNetwork(fileName)
+        accuracy = {}
+        for datasetName, dataset in datasets.items():
+            correct, total = sparse.evaluateBatch(dataset.images, dataset.labels)
+            accuracy[datasetName] = 100 * correct / total
+        results[sparsity] = {"accuracy": accuracy, "dense": imagesPerSecond(network, speedImages),
+                             "sparse": imagesPerSecond(sparse, speedImages) if sparsity > 0 else None,
+                             "bytes": os.path.getsize(fileName)}
+    print()
+    print("%-9s" % "sparsity", *("%14s" % datasetName[:14] for datasetName in datasets),
+          "%14s %14s %12s" % ("dense img/s", "sparse img/s", "file size"))
+    for sparsity, result in results.items():
+        print("%8.0f%%" % (100 * sparsity), *("%13.2f%%" % value for value in result["accuracy"].values()),
+              "%14.0f %14s %11.0fk" % (result["dense"], "-" if result["sparse"] is None else "%.0f" % result["sparse"],
+                                       result["bytes"] / 1024))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="prune a saved network and compare it with the unpruned network")
+    parser.add_argument("name", help="saved network file")
+    parser.add_argument("--sparsity", type=float, nargs="+", default=[0.5, 0.8, 0.9, 0.95])
+    parser.add_argument("--epochs", type=int, default=0, help="epochs of fine-tuning after pruning")
+    parser.add_argument("--lrnRate", type=float, default=0.1, help="learning rate of fine-tuning")
+    arguments = parser.parse_args()
+    training, _, testData = mnistLoader.load()
+    report(arguments.name, {"mnist test": testData,
+                            "my test": mnistLoader.loadMyImages("datasets/mytestimages3.pkl.gz")},
+           arguments.sparsity, training, arguments.epochs, arguments.lrnRate)
@@ -0,0 +1,161 @@
+# Sanjay Mohan
+# Post-training quantization of saved networks to int8 (or int16) weights, for smaller and faster inference
+# Each row of a layer's weights is scaled to the integer range separately (one float scale per row), and each column
+# of a layer's input (one image) gets its own scale as it is quantized during feedforward. Products of the integers are
+# summed exactly, then rescaled to floats for the bias and activation function.
+# numpy has no fast integer matrix multiply, so the integers are multiplied by BLAS as floats. Every product and partial
+# sum is an integer of at most prevNodes * largest ** 2, which is exact in float32 while it is below 2 ** 24 (int8 with
+# at most 1040 inputs, eg 127 * 127 * 784) and otherwise in float64 (below 2 ** 53, so any practical layer of int8 or
+# int16), so the result is the same as integer arithmetic; see accumulateType.
+# Usage: python -m NeuralNet.quantization mnist_exp_8520_converted --bits 8
+
+import argparse
+import contextlib
+import io
+import os
+import time
+
+import numpy as np
+
+from NeuralNet import mnistLoader
+from NeuralNet import net
+from NeuralNet.activations import getActivation
+
+
+# Integer type of the weights and inputs for each number of bits
+integerTypes = {8: np.int8, 16: np.int16}
+
+
+def accumulateType(bits, prevNodes):
+    # Float type whose BLAS sums prevNodes products of integers of the given bits exactly (float32 is faster)
+    largest = np.iinfo(integerTypes[bits]).max
+    return np.float32 if prevNodes * largest ** 2 < 2 ** 24 else np.float64
+
+
+def quantizeRows(w, bits):
+    """
+    :param w: (rows, columns) np.array of floats
+    :param bits: 8 or 16
+    :return: integer np.array of w, and (rows, 1) float32 np.array of scales so that w ~ integers * scales
+    """
+    integerType = integerTypes[bits]
+    largest = np.iinfo(integerType).max
+    scale = np.abs(w).max(axis=1, keepdims=True) / largest
+    scale[scale == 0] = 1  # all zero row
+    return np.rint(w / scale).astype(integerType), scale.astype(np.float32)
+
+
+class QuantizedLayer:
+
+    def __init__(self, qw, scale, b, activation="sigmoid", dtype=np.float32):
+        """
+        A net.Layer with integer weights, for inference only
+        :param qw: (nodes, prevNodes) int8 or int16 np.array of weights
+        :param scale: (nodes, 1) np.array of scales of the rows of qw
+        :param b: (nodes, 1) np.array of biases
+        :param dtype: precision of the biases and outputs
+        """
+        self.qw = qw
+        self.scale = scale
+        self.bits = 8 * qw.dtype.itemsize
+        self.size = len(qw)
+        self.accumulateType = accumulateType(self.bits, qw.shape[1])
+        self.activation = activation
+        self.b = b
+        self.computeWeights = None
+        self.setDtype(dtype)
+
+    def calculate(self, x):
+        # Returns a vector of length self.size with results of x input to this layer, as net.Layer.calculate
+        if len(x) != self.qw.shape[1]:
+            raise ValueError("Incorrect size of inputs: ", len(x))
+        if self.computeWeights is None:
+            # Integer valued copy for BLAS, made once
+            self.computeWeights = self.qw.astype(self.accumulateType)
+        # Quantize each column (image) of the input to the integer range
+        largest = np.iinfo(integerTypes[self.bits]).max
+        inputScale = np.abs(x).max(axis=0) / largest
+        inputScale[inputScale == 0] = 1
+        qx = np.multiply(x, 1 / inputScale, dtype=self.accumulateType)
+        np.rint(qx, out=qx)
+        # Exact integer sums, then rescaled in place
+        output = self.computeWeights.dot(qx)
+        output *= self.scale
+        output *= inputScale
+        output = output.astype(self.dtype, copy=False)
+        output += self.b
+        return getActivation(self.activation).forward(output)
+
+    def setDtype(self, dtype):
+        # Precision of biases and outputs; the weights stay integers
+        self.dtype = np.dtype(dtype)
+        self.b = self.b.astype(dtype, copy=False)
+
+    def modelEntry(self):
+        return {"kind": "quantized", "activation": self.activation,
+                "arrays": {"qw": self.qw, "scale": self.scale, "b": self.b}}
+
+
+def quantizeNetwork(network, bits=8):
+    """
+    :param network: trained net.Network
+    :param bits: 8 or 16
+    :return: net.Network of QuantizedLayers, computing in float32
+    """
+    layers = [None] + [QuantizedLayer(*quantizeRows(layer.w, bits), np.array(layer.b, dtype=np.float32),
+                                      layer.activation) for layer in network.layers[1:]]
+    return net.Network(None, layers, np.float32, cost=network.cost)
+
+
+def imagesPerSecond(network, images, repeats=3):
+    # Fastest of repeats batched classifications of images
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        network.predictBatch(images)
+        best = min(best, time.perf_counter() - start)
+    return len(images) / best
+
+
+def report(name, datasets, bits=(8, 16)):
+    """
+    Quantizes a saved network, saves each quantized network as name + "_int" + bits, and prints accuracy, speed and
+    file size against the float network
+    :param name: saved network file name
+    :param datasets: dict of name: mnistLoader.Dataset to measure accuracy on; speed is measured on the first
+    :return: dict of model label: dict of "accuracy" (dict of data set name: %), "imagesPerSecond" and "bytes"
+    """
+    network = net.loadNetwork(name)
+    models = {network.dtype.name: (network, name)}
+    for n in bits:
+        quantized = quantizeNetwork(network, n)
+        with contextlib.redirect_stdout(io.StringIO()):
+            quantized.saveNetwork(name + "_int" + str(n))
+        # Reloaded, so the measured network is the one that was saved
+        models["int" + str(n)] = (net.loadNetwork(name + "_int" + str(n)), name + "_int" + str(n))
+    speedImages = next(iter(datasets.values())).images
+    results = {}
+    for label, (model, fileName) in models.items():
+        accuracy = {}
+        for datasetName, dataset in datasets.items():
+            correct, total = model.evaluateBatch(dataset.images, dataset.labels)
+            accuracy[datasetName] = 100 * correct / total
+        results[label] = {"accuracy": accuracy, "imagesPerSecond": imagesPerSecond(model, speedImages),
+                          "bytes": os.path.getsize(fileName)}
+    print()
+    print("%-8s" % "model", *("%14s" % datasetName[:14] for datasetName in datasets), "%14s %12s" % ("images/s",
+                                                                                                  "file size"))
+    for label, result in results.items():
+        print("%-8s" % label, *("%13.2f%%" % value for value in result["accuracy"].values()),
+              "%14.0f %11.0fk" % (result["imagesPerSecond"], result["bytes"] / 1024))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="quantize a saved network and compare it with the float network")
+    parser.add_argument("name", help="saved network file")
+    parser.add_argument("--bits", type=int, nargs="+", choices=sorted(integerTypes), default=[8, 16])
+    arguments = parser.parse_args()
+    _, _, testData = mnistLoader.load()
+    report(arguments.name, {"mnist test": testData,
+                            "my test": mnistLoader.loadMyImages("datasets/mytestimages3.pkl.gz")}, arguments.bits)
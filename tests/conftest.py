@@ -0,0 +1,13 @@
+# Sanjay Mohan
+# Makes the repository importable as the NeuralNet package, whatever its directory is called
+
+import importlib.util
+import os
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if "NeuralNet" not in sys.modules:
+    spec = importlib.util.spec_from_file_location("NeuralNet", os.path.join(root, "__init__.py"),
+                                                  submodule_search_locations=[root])
+    sys.modules["NeuralNet"] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sys.modules["NeuralNet"])
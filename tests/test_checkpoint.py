@@ -0,0 +1,57 @@
+# Sanjay Mohan
+
+import os
+
+import numpy as np
+import pytest
+
+from NeuralNet import mnistLoader
+from NeuralNet import net
+from NeuralNet.checkpoint import Checkpointer
+
+
+def trainWithPartial(directory):
+    # Two complete checkpoints, then a partial third as left by a run stopped while writing it
+    rng = np.random.RandomState(0)
+    training = mnistLoader.Dataset(rng.rand(40, 784), rng.randint(0, 10, 40))
+    np.random.seed(0)
+    network = net.Network([784, 10, 10])
+    checkpointer = Checkpointer(directory)
+    network.gradientDescent(training, 2, 10, 0.1, seed=0, checkpointer=checkpointer)
+    partial = os.path.join(directory, "epoch_00003.tmp")
+    os.makedirs(partial)
+    open(os.path.join(partial, "optimizer.npz"), "wb").close()
+    return training, checkpointer, partial
+
+
+def test_latest_skips_partial(tmp_path):
+    directory = str(tmp_path)
+    _, checkpointer, _ = trainWithPartial(directory)
+    assert checkpointer.latest() == os.path.join(directory, "epoch_00002")
+
+
+def test_resume_next_to_partial(tmp_path):
+    directory = str(tmp_path)
+    training, _, partial = trainWithPartial(directory)
+    np.random.seed(1)
+    network = net.Network([784, 10, 10])
+    checkpointer = Checkpointer(directory)
+    assert not os.path.exists(partial)
+    network.gradientDescent(training, 3, 10, 0.1, seed=0, checkpointer=checkpointer, resume=True)
+    assert checkpointer.latest() == os.path.join(directory, "epoch_00003")
+
+
+def test_clear_removes_earlier_run(tmp_path):
+    directory = str(tmp_path)
+    trainWithPartial(directory)
+    checkpointer = Checkpointer(directory)
+    checkpointer.clear()
+    assert checkpointer.latest() is None
+
+
+def test_restore_into_different_layout_raises(tmp_path):
+    directory = str(tmp_path)
+    training, _, _ = trainWithPartial(directory)
+    network = net.Network([784, 20, 10])
+    with pytest.raises(ValueError, match="epoch_00002"):
+        network.gradientDescent(training, 3, 10, 0.1, seed=0, checkpointer=Checkpointer(directory), resume=True)
@@ -0,0 +1,39 @@
+# Sanjay Mohan
+
+import threading
+
+import numpy as np
+import pytest
+
+from NeuralNet import inferenceClient
+from NeuralNet import net
+from NeuralNet.inferenceServer import MicroBatcher, makeServer, toPixels
+
+
+def test_failed_batch_raises_and_batcher_keeps_serving():
+    network = net.Network([784, 10, 10])
+    batcher = MicroBatcher(network)
+    predictBatch = network.predictBatch
+    network.predictBatch = lambda *args, **kwargs: 1 / 0
+    with pytest.raises(RuntimeError, match="ZeroDivisionError"):
+        batcher.classify(np.zeros(784))
+    network.predictBatch = predictBatch
+    assert 0 <= batcher.classify(np.zeros(784))["digit"] < 10
+
+
+@pytest.mark.parametrize("body", [[1, 2], 3, "pixels", None])
+def test_body_must_be_object(body):
+    with pytest.raises(ValueError):
+        toPixels(body)
+
+
+def test_classify_over_unix_socket(tmp_path):
+    path = str(tmp_path / "digits.sock")
+    server = makeServer(net.Network([784, 10, 10]), unixSocket=path)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        result = inferenceClient.classify(inferenceClient.connect(unixSocket=path), np.zeros(784))
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert 0 <= result["digit"] < 10
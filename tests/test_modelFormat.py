@@ -0,0 +1,20 @@
+# Sanjay Mohan
+
+import os
+
+import numpy as np
+import pytest
+
+from NeuralNet import net
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_pickled_network_needs_allow_pickle():
+    with pytest.raises(ValueError, match="convertNetwork"):
+        net.loadNetwork(os.path.join(root, "mnist_exp_8520"))
+    pickled = net.loadNetwork(os.path.join(root, "mnist_exp_8520"), allowPickle=True)
+    converted = net.loadNetwork(os.path.join(root, "mnist_exp_8520_converted"), verify=True)
+    for layer, convertedLayer in zip(pickled.layers[1:], converted.layers[1:]):
+        assert np.array_equal(layer.w, convertedLayer.w)
+        assert np.array_equal(layer.b, convertedLayer.b)
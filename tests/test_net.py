@@ -0,0 +1,17 @@
+# Sanjay Mohan
+
+import numpy as np
+import pytest
+
+from NeuralNet import net
+
+
+def test_predict_batch_top_k_larger_than_outputs():
+    network = net.Network([784, 10, 10])
+    images = np.random.RandomState(0).rand(3, 784)
+    predictions, topDigits, topScores = network.predictBatch(images, topK=11)
+    assert topDigits.shape == topScores.shape == (3, 10)
+    assert np.array_equal(np.sort(topDigits, axis=1), np.tile(np.arange(10), (3, 1)))
+    assert np.array_equal(predictions, topDigits[:, 0])
+    with pytest.raises(ValueError):
+        network.predictBatch(images, topK=0)
@@ -0,0 +1,21 @@
+# Sanjay Mohan
+
+import queue
+
+import numpy as np
+
+from NeuralNet import net
+from NeuralNet.onlineLearning import FineTuner, SampleStore
+
+
+def test_fine_tuning_error_is_reported(tmp_path):
+    store = SampleStore(str(tmp_path / "samples.pkl.gz"))
+    for digit in range(5):
+        store.add(np.zeros((784, 1)), digit)
+    network = net.Network([784, 10, 10])
+    network.copy = lambda: 1 / 0
+    errors = queue.Queue()
+    tuner = FineTuner(network, store, lambda network: None, interval=0.01, error=errors.put)
+    message = errors.get(timeout=10)
+    tuner.stop()
+    assert message.startswith("Fine-tuning failed: ZeroDivisionError")
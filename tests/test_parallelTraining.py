@@ -0,0 +1,15 @@
+# Sanjay Mohan
+
+import numpy as np
+
+from NeuralNet import mnistLoader
+from NeuralNet import net
+from NeuralNet.parallelTraining import ParallelTrainer
+
+
+def test_gradient_descent_returns_history():
+    rng = np.random.RandomState(0)
+    training = mnistLoader.Dataset(rng.rand(20, 784), rng.randint(0, 10, 20))
+    with ParallelTrainer(net.Network([784, 10, 10]), processes=2, maxMinibatchSize=10) as trainer:
+        history = trainer.gradientDescent(training, 2, 10, 0.1, seed=0)
+    assert history["epochs"] == 2
@@ -0,0 +1,17 @@
+# Sanjay Mohan
+
+import numpy as np
+
+from NeuralNet import net
+from NeuralNet.pruning import sparseLayer
+
+
+def test_sparse_layer_matches_dense_with_empty_rows():
+    rng = np.random.RandomState(0)
+    w = rng.randn(7, 6)
+    # Leading, middle and trailing rows without weights, and some zeros in the other rows
+    w[[0, 3, 5, 6]] = 0
+    w[1, [0, 4]] = 0
+    layer = net.Layer(6, 7, w=w, b=rng.randn(7, 1))
+    x = rng.rand(6, 5)
+    assert np.allclose(sparseLayer(layer).calculate(x), layer.calculate(x))
@@ -0,0 +1,17 @@
+# Sanjay Mohan
+
+import numpy as np
+import pytest
+
+from NeuralNet.quantization import QuantizedLayer, quantizeRows
+
+
+@pytest.mark.parametrize("prevNodes, accumulateType", [(784, np.float32), (1040, np.float32), (1041, np.float64),
+                                                       (4000, np.float64)])
+def test_integer_sums_are_exact(prevNodes, accumulateType):
+    # Largest possible sums: every weight and input at the end of the int8 range
+    layer = QuantizedLayer(*quantizeRows(np.ones((2, prevNodes)), 8), np.zeros((2, 1)), activation="relu")
+    assert layer.accumulateType == accumulateType
+    qx = np.full((prevNodes, 1), 127, dtype=layer.accumulateType)
+    assert np.all(layer.qw.astype(layer.accumulateType).dot(qx) == prevNodes * 127 * 127)
+    assert np.allclose(layer.calculate(np.ones((prevNodes, 1))), prevNodes, rtol=1e-5)
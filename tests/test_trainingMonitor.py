@@ -0,0 +1,39 @@
+# Sanjay Mohan
+
+import numpy as np
+
+from NeuralNet import mnistLoader
+from NeuralNet import net
+from NeuralNet.trainingMonitor import ConsoleSink, MemorySink
+
+
+def firstGradientNorm(training, minibatchSize):
+    # gradientNorm of the first minibatch of one epoch, before any update
+    np.random.seed(0)
+    sink = MemorySink()
+    net.Network([784, 10, 10]).gradientDescent(training, 1, minibatchSize, 0.1, seed=0, callbacks=[sink])
+    return sink.minibatchRecords[0]["gradientNorm"]
+
+
+def test_gradient_norm_is_norm_of_average_gradient():
+    image = np.random.RandomState(1).rand(1, 784)
+    # Identical samples: the average gradient of any minibatch equals the gradient of one sample
+    training = mnistLoader.Dataset(np.repeat(image, 8, axis=0), np.full(8, 3))
+    single = firstGradientNorm(training, 1)
+    batched = firstGradientNorm(training, 8)
+    assert np.isclose(single, batched)
+
+    np.random.seed(0)
+    network = net.Network([784, 10, 10])
+    gradient_w, gradient_b = network.backwardPass(network.forwardPass(image.T),
+                                                  np.eye(10)[:, [3]].astype(network.dtype))
+    assert np.isclose(batched, np.sqrt(sum(np.vdot(g, g) for g in gradient_w + gradient_b)))
+
+
+def test_epoch_gradient_norm_without_minibatch_records(capsys):
+    rng = np.random.RandomState(0)
+    training = mnistLoader.Dataset(rng.rand(20, 784), rng.randint(0, 10, 20))
+    sink = MemorySink(minibatches=False)
+    net.Network([784, 10, 10]).gradientDescent(training, 1, 10, 0.1, seed=0, callbacks=[sink, ConsoleSink()])
+    assert sink.epochRecords[0]["gradientNorm"] > 0
+    assert "|gradient|" in capsys.readouterr().out
@@ -0,0 +1,201 @@
+# Sanjay Mohan
+# Instrumentation of net.Network.gradientDescent
+# TrainingMonitor times each part of training (waiting for data, forward pass, backward pass, update, validation) and
+# passes records of each epoch, and optionally of each minibatch, to callbacks such as the sinks below.
+# Without callbacks every method returns at once, so an uninstrumented run pays almost nothing.
+
+import csv
+import json
+import time
+
+import numpy as np
+
+
+# Fields of the records passed to callbacks
+minibatchFields = ["kind", "epoch", "minibatch", "samples", "dataTime", "forwardTime", "backwardTime", "updateTime",
+                   "gradientNorm"]
+epochFields = ["kind", "epoch", "minibatches", "samples", "time", "dataTime", "forwardTime", "backwardTime",
+               "updateTime", "samplesPerSecond", "gradientNorm", "validationTime", "accuracy", "stallTime"]
+
+
+class Callback:
+    # Base class of callbacks passed to gradientDescent; override any of the methods
+
+    minibatches = False  # True to also receive a record of every minibatch
+
+    def minibatchEnd(self, record):
+        pass
+
+    def epochEnd(self, record):
+        pass
+
+    def trainingEnd(self):
+        pass
+
+
+class TrainingMonitor:
+
+    def __init__(self, callbacks, loader, splitGradients=True):
+        """
+        Used by gradientDescent; calls its methods at each step of training
+        :param callbacks: list of Callbacks, or None
+        :param loader: batchLoader.MinibatchLoader of the training run, for its stall time
+        :param splitGradients: False if gradients are computed in one step (eg in parallel), so the forward and
+        backward passes can not be timed separately; their combined time is then reported as backwardTime
+        """
+        self.callbacks = list(callbacks or [])
+        self.enabled = bool(self.callbacks)
+        self.perMinibatch = any(callback.minibatches for callback in self.callbacks)
+        self.splitGradients = splitGradients and self.enabled
+        self.loader = loader
+
+    def epochBegin(self, epoch):
+        if not self.enabled:
+            return
+        self.epoch = epoch
+        self.totals = dict.fromkeys(["dataTime", "forwardTime", "backwardTime", "updateTime", "validationTime"], 0.0)
+        self.minibatch = 0
+        self.samples = 0
+        self.normTotal = 0.0
+        self.accuracy = None
+        self.stallStart = self.loader.stallTime
+        self.epochStart = self.last = time.perf_counter()
+
+    def minibatchBegin(self):
+        if not self.enabled:
+            return
+        self.mark = time.perf_counter()
+        self.current = {"dataTime": self.mark - self.last, "forwardTime": 0.0}
+
+    def forwardEnd(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.current["forwardTime"] = now - self.mark
+        self.mark = now
+
+    def backwardEnd(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.current["backwardTime"] = now - self.mark
+        self.mark = now
+
+    def minibatchEnd(self, size, gradient_w, gradient_b):
+        # gradient_w and gradient_b are averages over the minibatch (gradientDescent divides the summed gradients by
+        # size before calling), so gradientNorm does not grow with the minibatch size
+        if not self.enabled:
+            return
+        self.current["updateTime"] = time.perf_counter() - self.mark
+        for key, value in self.current.items():
+            self.totals[key] += value
+        self.samples += size
+        # Norm of the (average) gradient over all weights and biases; averaged over the epoch for its record
+        norm = float(np.sqrt(sum(np.vdot(g, g) for g in gradient_w + gradient_b)))
+        self.normTotal += norm
+        if self.perMinibatch:
+            record = {"kind": "minibatch", "epoch": self.epoch, "minibatch": self.minibatch, "samples": size,
+                      "gradientNorm": norm}
+            record.update(self.current)
+            for callback in self.callbacks:
+                if callback.minibatches:
+                    callback.minibatchEnd(record)
+        self.minibatch += 1
+        self.last = time.perf_counter()
+
+    def validationBegin(self):
+        if not self.enabled:
+            return
+        self.mark = time.perf_counter()
+
+    def validationEnd(self, accuracy):
+        if not self.enabled:
+            return
+        self.totals["validationTime"] = time.perf_counter() - self.mark
+        self.accuracy = accuracy
+
+    def epochEnd(self):
+        if not self.enabled:
+            return
+        elapsed = time.perf_counter() - self.epochStart
+        trainingTime = elapsed - self.totals["validationTime"]
+        record = {"kind": "epoch", "epoch": self.epoch, "minibatches": self.minibatch, "samples": self.samples,
+                  "time": elapsed, "samplesPerSecond": self.samples / trainingTime if trainingTime > 0 else None,
+                  "gradientNorm": self.normTotal / self.minibatch if self.minibatch else None,
+                  "accuracy": self.accuracy, "stallTime": self.loader.stallTime - self.stallStart}
+        record.update(self.totals)
+        for callback in self.callbacks:
+            callback.epochEnd(record)
+
+    def trainingEnd(self):
+        for callback in self.callbacks:
+            callback.trainingEnd()
+
+
+class ConsoleSink(Callback):
+
+    def __init__(self, everyMinibatches=0):
+        # Prints a summary of each epoch, and of every everyMinibatches-th minibatch if everyMinibatches > 0
+        self.everyMinibatches = everyMinibatches
+        self.minibatches = everyMinibatches > 0
+
+    def minibatchEnd(self, record):
+        if record["minibatch"] % self.everyMinibatches == 0:
+            print("  minibatch %d: data %.2f ms, forward %.2f ms, backward %.2f ms, update %.2f ms, |gradient| %.4g" % (
+                record["minibatch"], 1000 * record["dataTime"], 1000 * record["forwardTime"],
+                1000 * record["backwardTime"], 1000 * record["updateTime"], record["gradientNorm"]))
+
+    def epochEnd(self, record):
+        print("Epoch %d: %.2f s (data %.2f, forward %.2f, backward %.2f, update %.2f, validation %.2f), "
+              "%.0f samples/s, |gradient| %.4g" % (record["epoch"], record["time"], record["dataTime"],
+                                                   record["forwardTime"], record["backwardTime"], record["updateTime"],
+                                                   record["validationTime"], record["samplesPerSecond"] or 0,
+                                                   record["gradientNorm"] or 0))
+
+
+class FileSink(Callback):
+
+    def __init__(self, name, minibatches=False):
+        """
+        Writes records to a file, as csv if name ends with .csv and as json lines otherwise
+        :param name: name of file; overwritten
+        :param minibatches: if True, minibatch records are written as well as epoch records
+        """
+        self.minibatches = minibatches
+        self.file = open(name, "w", newline="")
+        self.writer = None
+        if name.endswith(".csv"):
+            fields = epochFields + [field for field in minibatchFields if field not in epochFields]
+            self.writer = csv.DictWriter(self.file, fields)
+            self.writer.writeheader()
+
+    def write(self, record):
+        if self.writer:
+            self.writer.writerow(record)
+        else:
+            self.file.write(json.dumps(record) + "\n")
+
+    def minibatchEnd(self, record):
+        self.write(record)
+
+    def epochEnd(self, record):
+        self.write(record)
+        self.file.flush()
+
+    def trainingEnd(self):
+        self.file.close()
+
+
+class MemorySink(Callback):
+
+    def __init__(self, minibatches=True):
+        # Keeps all records in the lists self.epochRecords and self.minibatchRecords
+        self.minibatches = minibatches
+        self.epochRecords = []
+        self.minibatchRecords = []
+
+    def minibatchEnd(self, record):
+        self.minibatchRecords.append(record)
+
+    def epochEnd(self, record):
+        self.epochRecords.append(record)